@@ -16,6 +16,7 @@ Updates:
 
 # Import modules
 import arcpy
+import openpyxl
 import os
 import shutil
 import time
@@ -129,54 +130,97 @@ def add_sf_fields(in_fc):
     arcpy.AddField_management(in_fc, "ID", "DOUBLE")
 
 
-def excel_to_value_table(biotics_or_pace, work_gdb, eo_or_sf):
+def read_excel_rows(in_table):
+    """Streams the rows of the first sheet of an Excel workbook, opened read-only so
+    rows are parsed one at a time instead of loading the whole workbook. The first
+    row holds the field names and is skipped. Yields each row as a list of values
+    typed by the cell (number, text or date; empty cells are None) with long text
+    kept whole. Blank rows, including trailing ones, are skipped."""
+    workbook = openpyxl.load_workbook(in_table, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        # Read-only sheets trust the stored dimension, which reporting tools often leave stale or
+        # missing, so read the cells actually in the file instead
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+        header = list(next(rows, None) or [])
+        # Ignore empty columns to the right of the last field name
+        while header and header[-1] is None:
+            header.pop()
+        width = len(header)
+        for values in rows:
+            row = list(values[:width])
+            if all(value is None for value in row):
+                continue
+            # Pad rows that end before the last column
+            row.extend([None] * (width - len(row)))
+            yield row
+    finally:
+        workbook.close()
+
+def normalize_excel_numbers(rows):
+    """Types the numbers in each column of the rows of one Excel table the way the
+    ExcelToTable tool did, since openpyxl returns whole numbers as int and others
+    as float. Numbers in a column of only numbers become float (a Double field);
+    numbers in a column that also holds text become text, whole numbers without
+    a decimal. Changes the rows in place."""
+    def is_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    for column in range(len(rows[0]) if rows else 0):
+        values = [row[column] for row in rows if row[column] is not None]
+        if not any(is_number(value) for value in values):
+            continue
+        as_text = any(isinstance(value, str) for value in values)
+        for row in rows:
+            value = row[column]
+            if not is_number(value):
+                continue
+            if as_text:
+                row[column] = str(int(value)) if float(value).is_integer() else str(value)
+            else:
+                row[column] = float(value)
+
+
+def excel_to_value_table(biotics_or_pace, eo_or_sf):
     """Loops through Excel tables, using hgis or biotics wildcard, in the in_path.
-    Converts Excel tables to GIS tables. Builds value table based on attributes
-    in GIS tables. Returns eo or sf value table."""
+    Reads the rows of each Excel table directly into the value table. Returns eo
+    or sf value table."""
     wildcard = "{0}_{1}*.xlsx".format(biotics_or_pace, eo_or_sf)
-    # Use enumerate function so n will be count of loops starting at 1
-    # n will be used to name the tables
-    for n, f in enumerate(arcpy.ListFiles(wildcard), 1):
-        # Variable for the input table
-        in_table = os.path.join(in_path, f)
-        # The output table is named based on eor or sf and the loop count, n
-        out_name = "{0}_table_{1}".format(eo_or_sf, n)
-        out_table = os.path.join(work_gdb, out_name)
-        # Convert excel table to GIS
-        arcpy.ExcelToTable_conversion(in_table, out_table)
-        """Note about why ExcelToTable tool was used:
-        Accessing csv directly via csv module -> Unicode errors
-        MakeTableView -> Long text fields came out null or were skipped
-        TableToTable tool -> Truncated long text fields to 254 even with geodatabase table as output"""
-    # ---- Loop through newly created GIS tables and create value table
-    # Set the workspace so ListTables will list the tables in the geodatabase
-    arcpy.env.workspace = work_gdb
-    # Use wildcard to list either eo or sf tables
-    wildcard = "{}_table*".format(eo_or_sf)
     # value_table will be a list of lists, which is like a table
     value_table = []
-    # Loop through tables
-    tables = arcpy.ListTables(wildcard)
-    for table in tables:
-        # Use search cursor to retrieve all attributes from table
-        srows = arcpy.da.SearchCursor(table, "*")
-        for srow in srows:
-            # The search cursor row data type is a tuple, so we convert it to a list
-            row = list(srow)
-            # Append the list of values to the value table
-            # Python slice notation is used to exclude the first column since it is OBJECTID
-            value_table.append(row[1:])
-        # Delete tables after use
-        arcpy.Delete_management(table)
-    """Note why we loop through GIS tables instead of merging into 1 GIS table:
-    When converting Excel to GIS, the GIS text field will be the minimum it needs
-    to be for that Excel table. If a preceding GIS table in the Merge has a shorter
-    max text length then the next, the tool will fail."""
-    # Set the workspace back to in_path
-    arcpy.env.workspace = in_path
+    for f in arcpy.ListFiles(wildcard):
+        # Variable for the input table
+        in_table = os.path.join(in_path, f)
+        # Append the rows of the excel table to the value table, with numbers typed by column
+        rows = list(read_excel_rows(in_table))
+        normalize_excel_numbers(rows)
+        value_table.extend(rows)
+    """Note why the Excel tables are read with openpyxl:
+    Accessing csv directly via csv module -> Unicode errors
+    MakeTableView -> Long text fields came out null or were skipped
+    TableToTable tool -> Truncated long text fields to 254 even with geodatabase table as output
+    ExcelToTable tool -> Worked, but every table was written to a scratch geodatabase and read back before use
+    Reading the workbook keeps long text whole and each table is only read once."""
     return value_table
 
 
+def index_value_table(value_table, id_column, id_name):
+    """Indexes a value table by the id in column id_column so the row of an id can
+    be found without looping through the whole table. Returns a dictionary of id:
+    list of rows (the same row lists that are in the value table). Ids that are in
+    more than one row are reported as a warning, because only the first of those rows gets the
+    geometry of the shape with that id."""
+    index = {}
+    for row in value_table:
+        index.setdefault(row[id_column], []).append(row)
+    duplicates = [uid for uid, rows in index.items() if len(rows) > 1]
+    if duplicates:
+        message = "{0} {1} values are in more than one row of the value table: {2}".format(len(duplicates), id_name, ", ".join(str(uid) for uid in duplicates))
+        arcpy.AddWarning(message)
+        print(message)
+    return index
+
+
 ########################################################################################################################
 print("Starting script at {}".format(datetime.datetime.now().strftime("%H:%M:%S")))
 ########################################################################################################################
@@ -199,8 +243,8 @@ print("Creating value tables from table views at {}".format(datetime.datetime.no
 ########################################################################################################################
 
 # Create value tables using excel_to_value_table function defined at top of script
-eor_values = excel_to_value_table("pace", pace_gdb, "eo")
-sf_values = excel_to_value_table("pace", pace_gdb, "sf")
+eor_values = excel_to_value_table("pace", "eo")
+sf_values = excel_to_value_table("pace", "sf")
 
 # For EOR values, calculate ID, AGENCYID1, and AGENCYID2 fields and add to value table
 count = 0
@@ -216,6 +260,10 @@ for row in sf_values:
     count += 1
     row.append(count)
 
+# Index the value tables by EO_ID and SF_ID so rows can be looked up directly when geometry is added
+eor_index = index_value_table(eor_values, 1, "EO_ID")
+sf_index = index_value_table(sf_values, 4, "SF_ID")
+
 ########################################################################################################################
 print("Creating eo ptreps at {}".format(datetime.datetime.now().strftime("%H:%M:%S")))
 ########################################################################################################################
@@ -231,12 +279,11 @@ for srow in srows:
     shape_xy = (srow[0], srow[1])
     # Get EO ID of search cursor row
     eoid = srow[2]
-    for row in eor_values:
-        # Look up the corresponding record in the value table
-        if row[1] == eoid:
-            # Append the tuple to the end of the row, so it can later be inserted as the SHAPE@XY geometry token
-            row.append(shape_xy)
-            break
+    # Look up the corresponding record in the value table index
+    rows = eor_index.get(eoid)
+    if rows:
+        # Append the tuple to the end of the row, so it can later be inserted as the SHAPE@XY geometry token
+        rows[0].append(shape_xy)
 
 # ---- Create eoptreps
 # Create eo ptreps
@@ -278,12 +325,11 @@ srows = arcpy.da.SearchCursor(eo_shape, ["EO_ID", "SHAPE@"])
 for srow in srows:
     # Create variable for search cursor (eo shape) EO ID
     eoid = srow[0]
-    # Look up the corresponding record in the eor value table
-    for row in eor_values:
-        if row[1] == eoid:
-            # Replace the last item in the row with the geometry object for eo reps
-            row[-1] = srow[1]
-            break
+    # Look up the corresponding record in the eor value table index
+    rows = eor_index.get(eoid)
+    if rows:
+        # Replace the last item in the row with the geometry object for eo reps
+        rows[0][-1] = srow[1]
 
 # Update field list to geometry object token instead of XY coordinates
 eor_fields[-1] = "SHAPE@"
@@ -349,27 +395,27 @@ for srow in srows:
     sfid = srow[0]
     # Create variable for geometry
     geo = srow[1]
-    # Look up the corresponding record in the sf value table
-    for row in sf_values:
-        if row[4] == sfid:
-            # Add geometry object to end of the row
-            row.append(geo)
-            # Insert row into new feature class
-            try:
-                cursor.insertRow(row)
-            except:
-                print("{0}: {1} Failed at {2}".format("SF ID", row[4], datetime.datetime.now().strftime("%H:%M:%S")))
-                # Get traceback object
-                tb = sys.exc_info()[2]
-                tbinfo = traceback.format_tb(tb)[0]
-                # Concate information together concerning th error into a message string
-                pymsg = "PYTHON ERRORS:\nTraceback info:\n" + tbinfo + "\nError Info:\n" + str(sys.exc_info()[1])
-                msgs = "ArcPy ERRORS:\n" + arcpy.GetMessages(2) + "\n"
-                # Return python error messages
-                print(pymsg)
-                print(msgs)
-                print
-            break
+    # Look up the corresponding record in the sf value table index
+    rows = sf_index.get(sfid)
+    if rows:
+        row = rows[0]
+        # Add geometry object to end of the row
+        row.append(geo)
+        # Insert row into new feature class
+        try:
+            cursor.insertRow(row)
+        except:
+            print("{0}: {1} Failed at {2}".format("SF ID", row[4], datetime.datetime.now().strftime("%H:%M:%S")))
+            # Get traceback object
+            tb = sys.exc_info()[2]
+            tbinfo = traceback.format_tb(tb)[0]
+            # Concate information together concerning th error into a message string
+            pymsg = "PYTHON ERRORS:\nTraceback info:\n" + tbinfo + "\nError Info:\n" + str(sys.exc_info()[1])
+            msgs = "ArcPy ERRORS:\n" + arcpy.GetMessages(2) + "\n"
+            # Return python error messages
+            print(pymsg)
+            print(msgs)
+            print
 del cursor
 
 ########################################################################################################################
@@ -393,26 +439,26 @@ for srow in srows:
     sfid = srow[0]
     # Create variable for geometry
     geo = srow[1]
-    # Look up the corresponding record in the sf value table
-    for row in sf_values:
-        if row[4] == sfid:
-            # Add geometry object to end of the row
-            row.append(geo)
-            # Insert row into new feature class
-            try:
-                cursor.insertRow(row)
-            except:
-                print("{0}: {1} Failed at {2}".format("SF ID", row[4], datetime.datetime.now().strftime("%H:%M:%S")))
-                # Get traceback object
-                tb = sys.exc_info()[2]
-                tbinfo = traceback.format_tb(tb)[0]
-                # Concate information together concerning th error into a message string
-                pymsg = "PYTHON ERRORS:\nTraceback info:\n" + tbinfo + "\nError Info:\n" + str(sys.exc_info()[1])
-                msgs = "ArcPy ERRORS:\n" + arcpy.GetMessages(2) + "\n"
-                # Return python error messages
-                print(pymsg)
-                print(msgs)
-            break
+    # Look up the corresponding record in the sf value table index
+    rows = sf_index.get(sfid)
+    if rows:
+        row = rows[0]
+        # Add geometry object to end of the row
+        row.append(geo)
+        # Insert row into new feature class
+        try:
+            cursor.insertRow(row)
+        except:
+            print("{0}: {1} Failed at {2}".format("SF ID", row[4], datetime.datetime.now().strftime("%H:%M:%S")))
+            # Get traceback object
+            tb = sys.exc_info()[2]
+            tbinfo = traceback.format_tb(tb)[0]
+            # Concate information together concerning th error into a message string
+            pymsg = "PYTHON ERRORS:\nTraceback info:\n" + tbinfo + "\nError Info:\n" + str(sys.exc_info()[1])
+            msgs = "ArcPy ERRORS:\n" + arcpy.GetMessages(2) + "\n"
+            # Return python error messages
+            print(pymsg)
+            print(msgs)
 del cursor
 
 ########################################################################################################################
@@ -445,30 +491,30 @@ for srow in srows:
     sfid = srow[0]
     # Create variable for geometry
     geo = srow[1]
-    # Look up the corresponding record in the sf value table
-    for row in sf_values:
-        if row[4] == sfid:
-            # Add geometry object to end of the row
-            row.append(geo)
-            # Append Y coordinates to row to populate latitude field
-            row.append(srow[1][1])
-            # Append X coordinates to row to populate longitude field
-            row.append(srow[1][0])
-            # Insert row into new feature class
-            try:
-                cursor.insertRow(row)
-            except:
-                print("{0}: {1} Failed at {2}".format("SF ID", row[4], datetime.datetime.now().strftime("%H:%M:%S")))
-                # Get traceback object
-                tb = sys.exc_info()[2]
-                tbinfo = traceback.format_tb(tb)[0]
-                # Concate information together concerning th error into a message string
-                pymsg = "PYTHON ERRORS:\nTraceback info:\n" + tbinfo + "\nError Info:\n" + str(sys.exc_info()[1])
-                msgs = "ArcPy ERRORS:\n" + arcpy.GetMessages(2) + "\n"
-                # Return python error messages
-                print(pymsg)
-                print(msgs)
-            break
+    # Look up the corresponding record in the sf value table index
+    rows = sf_index.get(sfid)
+    if rows:
+        row = rows[0]
+        # Add geometry object to end of the row
+        row.append(geo)
+        # Append Y coordinates to row to populate latitude field
+        row.append(srow[1][1])
+        # Append X coordinates to row to populate longitude field
+        row.append(srow[1][0])
+        # Insert row into new feature class
+        try:
+            cursor.insertRow(row)
+        except:
+            print("{0}: {1} Failed at {2}".format("SF ID", row[4], datetime.datetime.now().strftime("%H:%M:%S")))
+            # Get traceback object
+            tb = sys.exc_info()[2]
+            tbinfo = traceback.format_tb(tb)[0]
+            # Concate information together concerning th error into a message string
+            pymsg = "PYTHON ERRORS:\nTraceback info:\n" + tbinfo + "\nError Info:\n" + str(sys.exc_info()[1])
+            msgs = "ArcPy ERRORS:\n" + arcpy.GetMessages(2) + "\n"
+            # Return python error messages
+            print(pymsg)
+            print(msgs)
 del cursor
 
 ########################################################################################################################
@@ -0,0 +1,10 @@
+#-------------------------------------------------------------------------------
+# Name:         pnhp_tools
+# Purpose:      Pure-Python engines shared by the PNHP Python toolboxes. Nothing in
+#               this package imports arcpy, so the engines can be run and timed
+#               outside of ArcGIS Pro. Toolboxes add the root of the repository to
+#               sys.path and import the modules they need, e.g.
+#                   from pnhp_tools import grouping
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
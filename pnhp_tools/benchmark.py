@@ -0,0 +1,544 @@
+#-------------------------------------------------------------------------------
+# Name:         benchmark.py
+# Purpose:      Synthetic data generator and benchmark harness for the grouping
+#               engines behind the bulk load TerrestrialGrouping and
+#               AquaticGrouping tools and the rank calculator TerrestrialGrouping
+#               tool. Builds reproducible datasets of clustered observations, EO
+#               reps, source features and a dendritic flowline network with dams,
+#               times each phase of the tools and checks the groups against brute
+#               force reference implementations. Runs offline, without arcpy:
+#                   python -m pnhp_tools.benchmark --sizes 1000 10000 100000
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import argparse
+import heapq
+import math
+import random
+
+import numpy as np
+
+from pnhp_tools import geometry, grouping, network, parallel, progress, snapping
+
+# separation distances (km) given to the synthetic species
+TERRESTRIAL_SEPARATIONS = (0.5, 1.0, 2.0)
+AQUATIC_SEPARATIONS = (1.0, 2.0, 5.0)
+
+# flowlines in each synthetic river basin and the spacing of the basins (m)
+BASIN_EDGES = 200
+BASIN_SPACING = 15000.0
+
+
+def _shape(rng, kind, x, y):
+    # a point, a short wandering line or an irregular polygon around (x, y)
+    if kind == "point":
+        return geometry.Shape("point", [[(x, y)]])
+    if kind == "line":
+        heading = rng.uniform(0.0, 2.0 * math.pi)
+        part = [(x, y)]
+        for i in range(rng.randint(1, 5)):
+            heading += rng.uniform(-0.5, 0.5)
+            step = rng.uniform(20.0, 80.0)
+            x += step * math.cos(heading)
+            y += step * math.sin(heading)
+            part.append((x, y))
+        return geometry.Shape("line", [part])
+    n = rng.randint(4, 8)
+    radius = rng.uniform(10.0, 100.0)
+    ring = []
+    for i in range(n):
+        r = radius * rng.uniform(0.6, 1.0)
+        ring.append((x + r * math.cos(2.0 * math.pi * i / n), y + r * math.sin(2.0 * math.pi * i / n)))
+    ring.append(ring[0])
+    return geometry.Shape("polygon", [ring])
+
+
+def terrestrial_dataset(n, species_count=20, seed=1):
+    """Returns a reproducible synthetic bulk load dataset of n observations as
+    (observations, eo_reps, source_features) in the forms taken by
+    grouping.terrestrial_eo_groups() and grouping.source_feature_groups().
+
+    Observations of each species are clustered around a few centers, with about
+    25 observations per center, and are 70% points, 20% lines and 10% polygons.
+    Each species has a separation distance from TERRESTRIAL_SEPARATIONS, and one
+    record in five also has an estimated LU distance added to it. About 5% of the
+    records are already assigned. Half of the centers of each species have an EO
+    rep, and there is one source feature point for every ten observations."""
+    rng = random.Random(seed)
+    side = math.sqrt(n) * 400.0
+    species = ["SP" + str(i).zfill(3) for i in range(species_count)]
+    separation = {s: rng.choice(TERRESTRIAL_SEPARATIONS) for s in species}
+    per_species = max(1, n // (species_count * 25))
+    centers = {s: [(rng.uniform(0.0, side), rng.uniform(0.0, side)) for i in range(per_species)] for s in species}
+
+    observations = []
+    for i in range(n):
+        s = rng.choice(species)
+        cx, cy = rng.choice(centers[s])
+        kind = rng.choices(("point", "line", "polygon"), (7, 2, 1))[0]
+        radii = grouping.search_radii([separation[s]], ["estimated" if rng.random() < 0.2 else "precise"], [rng.uniform(10.0, 500.0)])
+        shape = _shape(rng, kind, rng.gauss(cx, 800.0), rng.gauss(cy, 800.0))
+        observations.append((str(i + 1), s, float(radii[0]), shape, rng.random() < 0.05))
+
+    eo_reps = []
+    for s in species:
+        for cx, cy in centers[s]:
+            if rng.random() < 0.5:
+                eo_reps.append((10000 + len(eo_reps), s, _shape(rng, "polygon", rng.gauss(cx, 500.0), rng.gauss(cy, 500.0))))
+    source_features = []
+    for i in range(max(1, n // 10)):
+        s = rng.choice(species)
+        cx, cy = rng.choice(centers[s])
+        source_features.append((50000 + i, s, _shape(rng, "point", rng.gauss(cx, 800.0), rng.gauss(cy, 800.0))))
+    return observations, eo_reps, source_features
+
+
+def flowline_network(edge_count, seed=1):
+    """Returns a reproducible synthetic flowline network of about edge_count
+    flowlines as a list of (key, parts) for network.build_network(), along with
+    a dictionary of key: list of neighboring keys. The network is a grid of
+    river basins of BASIN_EDGES flowlines each; each basin is a tree grown
+    upstream from its outlet, with flowlines of 2 to 7 segments that split in two
+    at their upper ends."""
+    rng = random.Random(seed)
+    basins = max(1, int(math.ceil(edge_count / float(BASIN_EDGES))))
+    columns = int(math.ceil(math.sqrt(basins)))
+    flowlines = []
+    neighbors = {}
+    for b in range(basins):
+        ox = (b % columns) * BASIN_SPACING
+        oy = (b // columns) * BASIN_SPACING
+        frontier = [(ox, oy, math.pi / 2.0, None)]
+        grown = 0
+        while frontier and grown < BASIN_EDGES and len(flowlines) < edge_count:
+            x, y, heading, parent = frontier.pop(rng.randrange(len(frontier)))
+            key = len(flowlines) + 1
+            part = [(x, y)]
+            for i in range(rng.randint(2, 7)):
+                heading += rng.uniform(-0.3, 0.3)
+                step = rng.uniform(100.0, 250.0)
+                x += step * math.cos(heading)
+                y += step * math.sin(heading)
+                part.append((x, y))
+            flowlines.append((key, [part]))
+            neighbors[key] = []
+            if parent is not None:
+                neighbors[key].append(parent)
+                neighbors[parent].append(key)
+            grown += 1
+            for turn in (-0.6, 0.6):
+                frontier.append((x, y, heading + turn + rng.uniform(-0.2, 0.2), key))
+    return flowlines, neighbors
+
+
+def _along(rng, part, offset):
+    # a random point on a random interior stretch of a segment, moved sideways by offset
+    i = rng.randrange(len(part) - 1)
+    (x0, y0), (x1, y1) = part[i], part[i + 1]
+    t = rng.uniform(0.05, 0.95)
+    length = math.hypot(x1 - x0, y1 - y0)
+    return x0 + t * (x1 - x0) - offset * (y1 - y0) / length, y0 + t * (y1 - y0) + offset * (x1 - x0) / length
+
+
+def aquatic_dataset(n, species_count=20, seed=1, snap_dist=100.0):
+    """Returns a reproducible synthetic aquatic dataset of n observations as a
+    dictionary with "flowlines" (see flowline_network()), "observations" as
+    (key, species, shape), "separation" (species: km), "dams" as (key, x, y)
+    points on the flowlines, "eo_reps" as (eo_id, species, shape) and
+    "source_features" as (sf_id, species, shape).
+
+    The network has one flowline for every two observations. Each species lives
+    in a few home flowlines, and its observations are placed on flowlines a short
+    walk from them, within the snap distance of the line, except for 2% that are
+    too far away to snap. There is a dam on one flowline in 25."""
+    rng = random.Random(seed)
+    flowlines, neighbors = flowline_network(max(50, n // 2), seed)
+    parts = {key: p[0] for key, p in flowlines}
+    keys = sorted(parts)
+    species = ["SP" + str(i).zfill(3) for i in range(species_count)]
+    separation = {s: rng.choice(AQUATIC_SEPARATIONS) for s in species}
+    per_species = max(1, n // (species_count * 25))
+    homes = {s: [rng.choice(keys) for i in range(per_species)] for s in species}
+
+    def walk(key):
+        for i in range(rng.randint(0, 8)):
+            key = rng.choice(neighbors[key]) if neighbors[key] else key
+        return key
+
+    observations = []
+    for i in range(n):
+        s = rng.choice(species)
+        part = parts[walk(rng.choice(homes[s]))]
+        offset = rng.uniform(-0.8, 0.8) * snap_dist if rng.random() > 0.02 else 3.0 * snap_dist
+        kind = rng.choices(("point", "line", "polygon"), (7, 2, 1))[0]
+        x, y = _along(rng, part, offset)
+        if kind == "point":
+            shape = geometry.Shape("point", [[(x, y)]])
+        elif kind == "line":
+            shape = geometry.Shape("line", [[(x, y), _along(rng, part, offset)]])
+        else:
+            r = rng.uniform(10.0, 30.0)
+            shape = geometry.Shape("polygon", [[(x - r, y - r), (x + r, y - r), (x + r, y + r), (x - r, y + r), (x - r, y - r)]])
+        observations.append((str(i + 1), s, shape))
+
+    dams = []
+    for key in keys:
+        if rng.random() < 0.04:
+            x, y = _along(rng, parts[key], 0.0)
+            dams.append((len(dams) + 1, x, y))
+    eo_reps = []
+    source_features = []
+    for s in species:
+        for home in homes[s]:
+            if rng.random() < 0.5:
+                x, y = _along(rng, parts[walk(home)], 0.0)
+                eo_reps.append((10000 + len(eo_reps), s, geometry.Shape("polygon", [[(x - 40, y - 40), (x + 40, y - 40), (x + 40, y + 40), (x - 40, y + 40), (x - 40, y - 40)]])))
+            x, y = _along(rng, parts[walk(home)], rng.uniform(-5.0, 5.0))
+            source_features.append((50000 + len(source_features), s, geometry.Shape("point", [[(x, y)]])))
+    return {"flowlines": flowlines, "observations": observations, "separation": separation, "dams": dams,
+            "eo_reps": eo_reps, "source_features": source_features}
+
+
+class _Reference(object):
+    # the segments and vertices of a shape as arrays, for reference_distance()
+    __slots__ = ("polygon", "segments", "x", "y", "box")
+
+    def __init__(self, shape):
+        rows = []
+        for part in shape.parts:
+            rows.extend(p + q for p, q in zip(part, part[1:]) if len(part) > 1)
+            if len(part) == 1:
+                rows.append(part[0] + part[0])
+        self.polygon = shape.kind == "polygon"
+        self.segments = np.array(rows, dtype=np.float64).reshape(-1, 4)
+        self.x = np.concatenate([self.segments[:, 0], self.segments[:, 2]])
+        self.y = np.concatenate([self.segments[:, 1], self.segments[:, 3]])
+        self.box = (self.x.min(), self.y.min(), self.x.max(), self.y.max())
+
+
+def _vertex_segment(x, y, segments):
+    # distance from every vertex (rows) to every segment (columns)
+    x0, y0, x1, y1 = segments[:, 0], segments[:, 1], segments[:, 2], segments[:, 3]
+    dx = x1 - x0
+    dy = y1 - y0
+    length2 = dx * dx + dy * dy
+    t = ((x[:, None] - x0) * dx + (y[:, None] - y0) * dy) / np.where(length2 > 0.0, length2, 1.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(x[:, None] - (x0 + t * dx), y[:, None] - (y0 + t * dy))
+
+
+def _any_inside(polygon, x, y):
+    # true if any of the vertices is inside the polygon, counting crossings of a ray to the right of each
+    # vertex with every ring edge (even-odd)
+    x0, y0, x1, y1 = polygon.segments[:, 0], polygon.segments[:, 1], polygon.segments[:, 2], polygon.segments[:, 3]
+    spans = (y0 > y[:, None]) != (y1 > y[:, None])
+    at = x0 + (y[:, None] - y0) * (x1 - x0) / np.where(y1 != y0, y1 - y0, 1.0)
+    return bool(np.any(np.sum(spans & (x[:, None] < at), axis=1) % 2 == 1))
+
+
+def reference_distance(a, b):
+    """Brute force distance between two shapes held as _Reference arrays, written
+    without geometry or proximity so it can check them: zero if a vertex of one
+    is inside the other or two segments cross, otherwise the smallest distance
+    from any vertex of one to any segment of the other."""
+    if (a.polygon and _any_inside(a, b.x, b.y)) or (b.polygon and _any_inside(b, a.x, a.y)):
+        return 0.0
+    ax0, ay0, ax1, ay1 = (a.segments[:, i:i + 1] for i in range(4))
+    bx0, by0, bx1, by1 = b.segments[:, 0], b.segments[:, 1], b.segments[:, 2], b.segments[:, 3]
+    side_a = ((bx1 - bx0) * (ay0 - by0) - (by1 - by0) * (ax0 - bx0)) * ((bx1 - bx0) * (ay1 - by0) - (by1 - by0) * (ax1 - bx0))
+    side_b = ((ax1 - ax0) * (by0 - ay0) - (ay1 - ay0) * (bx0 - ax0)) * ((ax1 - ax0) * (by1 - ay0) - (ay1 - ay0) * (bx1 - ax0))
+    if np.any((side_a < 0.0) & (side_b < 0.0)):
+        return 0.0
+    return float(min(_vertex_segment(a.x, a.y, b.segments).min(), _vertex_segment(b.x, b.y, a.segments).min()))
+
+
+def _near(a, b, radius):
+    # reference_distance() is at least the gap between the bounding boxes, so pairs farther apart are not measured
+    if math.hypot(max(a.box[0] - b.box[2], b.box[0] - a.box[2], 0.0), max(a.box[1] - b.box[3], b.box[1] - a.box[3], 0.0)) > radius:
+        return False
+    return reference_distance(a, b) <= radius
+
+
+def reference_groups(observations, features, fields):
+    """Brute force version of grouping.assign_groups(): every pair of unassigned
+    observations of a species is measured with reference_distance(), and so is
+    every member of a group against every feature of its species. Returns a
+    dictionary of key: (field, value) like assign_groups(), with new groups
+    numbered "ref_"."""
+    results = {}
+    number = 1
+    for species, records in parallel.partition_by_species([o for o in observations if not o[4]]):
+        uf = grouping.UnionFind(o[0] for o in records)
+        shapes = {o[0]: _Reference(o[3]) for o in records}
+        for i, a in enumerate(records):
+            for b in records[i + 1:]:
+                if _near(shapes[a[0]], shapes[b[0]], max(a[2], b[2])):
+                    uf.union(a[0], b[0])
+        lookup = {o[0]: o for o in records}
+        nearby = [(f[0], _Reference(f[2])) for f in features if f[1] == species]
+        for members in uf.components():
+            ids = sorted({str(int(f[0])) for key in members for f in nearby if _near(f[1], shapes[key], lookup[key][2])})
+            if ids:
+                value = (fields[0], ",".join(ids))
+            else:
+                value = (fields[1], "ref_" + str(number))
+                number += 1
+            for key in members:
+                results[key] = value
+    return results
+
+
+def reference_clusters(observations):
+    """Brute force version of grouping.cluster(), testing every pair of
+    observations of the same species with reference_distance()."""
+    uf = grouping.UnionFind(o[0] for o in observations)
+    for species, records in parallel.partition_by_species(observations):
+        shapes = {o[0]: _Reference(o[3]) for o in records}
+        for i, a in enumerate(records):
+            for b in records[i + 1:]:
+                if _near(shapes[a[0]], shapes[b[0]], max(a[2], b[2])):
+                    uf.union(a[0], b[0])
+    return uf.components()
+
+
+def reference_network_groups(net, snaps, separation, eo_edges, cuts):
+    """Brute force version of network.species_network_groups() for one species,
+    using every snap. Each flowline is split at the snaps, dams and EO rep
+    stretch ends on it into an explicit graph, with no link across a dam, and a
+    Dijkstra search to the separation distance is run from every observation.
+    Returns a list of (members, eoid) like species_network_groups()."""
+    positions = {}
+    for n, (key, edge, measure) in enumerate(snaps):
+        positions.setdefault(edge, []).append((measure, ("snap", n)))
+    for n, (eo_id, edge, low, high) in enumerate(eo_edges):
+        positions.setdefault(edge, []).append((low, ("eo", n, 0)))
+        positions.setdefault(edge, []).append((high, ("eo", n, 1)))
+    graph = {}
+    for edge in range(net.edge_count):
+        length = float(net.edge_length[edge])
+        stops = [(0.0, ("node", int(net.edge_from[edge])))] + sorted(positions.get(edge, [])) + [(length, ("node", int(net.edge_to[edge])))]
+        barriers = cuts.get(edge, [])
+        for (m1, a), (m2, b) in zip(stops, stops[1:]):
+            if not any(m1 < c < m2 for c in barriers):
+                graph.setdefault(a, []).append((b, m2 - m1))
+                graph.setdefault(b, []).append((a, m2 - m1))
+
+    by_key = {}
+    for n, snap in enumerate(snaps):
+        by_key.setdefault(snap[0], []).append(n)
+    uf = grouping.UnionFind(by_key)
+    reached = {}
+    for key, sources in by_key.items():
+        best = {}
+        heap = [(0.0, ("snap", n)) for n in sources]
+        while heap:
+            d, node = heapq.heappop(heap)
+            if node in best:
+                continue
+            best[node] = d
+            for other, length in graph.get(node, ()):
+                if other not in best and d + length <= separation:
+                    heapq.heappush(heap, (d + length, other))
+        found = set()
+        for node in best:
+            if node[0] == "snap" and snaps[node[1]][0] != key:
+                uf.union(key, snaps[node[1]][0])
+            elif node[0] == "eo":
+                found.add(eo_edges[node[1]][0])
+        # a snap inside an EO rep stretch is on the EO rep even if a dam cuts it off from both ends
+        for n in sources:
+            for eo_id, edge, low, high in eo_edges:
+                if edge == snaps[n][1] and low <= snaps[n][2] <= high:
+                    found.add(eo_id)
+        reached[key] = found
+    groups = []
+    for members in uf.components():
+        found = set()
+        for key in members:
+            found.update(reached[key])
+        groups.append((members, ",".join(sorted({str(int(eo_id)) for eo_id in found}))))
+    return groups
+
+
+def _canonical(results, id_field):
+    # existing ids compare by value and new groups by their members, since new strings are numbered differently
+    members = {}
+    for key, value in results.items():
+        members.setdefault(value, set()).add(key)
+    return {key: value if value[0] == id_field else (value[0], frozenset(members[value])) for key, value in results.items()}
+
+
+def mismatches(results, expected, id_field):
+    """Returns the number of keys whose assignment in results differs from the one
+    in expected, both dictionaries of key: (field, value). Existing ids must be
+    the same and new groups must have the same members."""
+    got = _canonical(results, id_field)
+    want = _canonical(expected, id_field)
+    return sum(1 for key in set(got) | set(want) if got.get(key) != want.get(key))
+
+
+def group_mismatches(groups, expected):
+    """Returns the number of keys whose group (members and EO IDs) differs between
+    two lists of (members, eoid)."""
+    def by_key(found):
+        return {key: (frozenset(members), eoid) for members, eoid in found for key in members}
+    got = by_key(groups)
+    want = by_key(expected)
+    return sum(1 for key in set(got) | set(want) if got.get(key) != want.get(key))
+
+
+def _report_check(name, wrong, total):
+    print("  check " + name + ": " + ("OK" if not wrong else str(wrong) + " of " + str(total) + " differ from the reference"))
+    return wrong
+
+
+def run_terrestrial(n, species_count, seed, processes, check, trace):
+    """Times the bulk load TerrestrialGrouping engine (EO groups, SF groups and
+    unique ids) on a synthetic dataset of n observations. Returns (phases,
+    mismatches) where phases is the list of (phase, seconds, count) from
+    progress.Progress and mismatches is None if the result was not checked."""
+    with progress.Progress(print, interval=60.0, trace=trace, tool="bulk load terrestrial n=" + str(n)) as reporter:
+        reporter.start("Generating data")
+        observations, eo_reps, source_features = terrestrial_dataset(n, species_count, seed)
+        reporter.start("Assigning EO IDs")
+        eo_results, word_index = grouping.terrestrial_eo_groups(observations, eo_reps, 1, processes)
+        reporter.start("Assigning SF IDs")
+        sf_observations = [(o[0], o[1], 9, o[3], o[4]) for o in observations]
+        sf_results, word_index = grouping.source_feature_groups(sf_observations, source_features, word_index, processes)
+        reporter.start("Numbering source features")
+        assignments = {o[0]: [None, None, None, None] for o in observations}
+        for key, (field, value) in sf_results.items():
+            assignments[key][0 if field == "SF_ID" else 1] = value
+        grouping.unique_ids(assignments)
+
+    wrong = None
+    if n <= check:
+        wrong = _report_check("EO groups", mismatches(eo_results, reference_groups(observations, eo_reps, ("EO_ID", "EO_NEW")), "EO_ID"), n)
+        wrong += _report_check("SF groups", mismatches(sf_results, reference_groups(sf_observations, source_features, ("SF_ID", "SF_NEW")), "SF_ID"), n)
+    return reporter.phases, wrong
+
+
+def run_rank_terrestrial(n, species_count, seed, check, trace):
+    """Times the rank calculator TerrestrialGrouping engine (grouping.cluster()) on
+    a synthetic dataset of n observations. Returns (phases, mismatches)."""
+    with progress.Progress(print, interval=60.0, trace=trace, tool="rank calculator terrestrial n=" + str(n)) as reporter:
+        reporter.start("Generating data")
+        observations = [o[:4] for o in terrestrial_dataset(n, species_count, seed)[0]]
+        reporter.start("Grouping observations")
+        components = grouping.cluster(observations)
+
+    wrong = None
+    if n <= check:
+        got = {key: frozenset(c) for c in components for key in c}
+        want = {key: frozenset(c) for c in reference_clusters(observations) for key in c}
+        wrong = _report_check("groups", sum(1 for key in want if got.get(key) != want[key]), n)
+    return reporter.phases, wrong
+
+
+def run_aquatic(n, species_count, seed, processes, check, trace, snap_dist=100.0):
+    """Times the bulk load AquaticGrouping engine the way the tool runs it:
+    building the network, snapping observations and dams, finding EO rep
+    stretches, grouping each species along the network and assigning SFs, on a
+    synthetic dataset of n observations. Returns (phases, mismatches)."""
+    with progress.Progress(print, interval=60.0, trace=trace, tool="bulk load aquatic n=" + str(n)) as reporter:
+        reporter.start("Generating data")
+        data = aquatic_dataset(n, species_count, seed, snap_dist)
+        observations = data["observations"]
+        species_of = {key: species for key, species, shape in observations}
+        reporter.start("Building the flowline network")
+        net = network.build_network(data["flowlines"])
+        reporter.start("Indexing flowline segments")
+        snap_index = snapping.SnapIndex(net)
+        reporter.start("Snapping observations", len(observations))
+        snaps = {}
+        for key, species, shape in observations:
+            for k, edge, measure, dist in snap_index.snap_shape(key, shape, snap_dist):
+                snaps.setdefault(species, []).append((k, edge, measure))
+            reporter.step()
+        reporter.start("Snapping dams")
+        dam_snaps, dam_missed = snap_index.snap(data["dams"], 1.1)
+        cuts = network.cut_edges([(edge, measure) for key, edge, measure, dist in dam_snaps])
+        reporter.start("Finding EO rep stretches")
+        eo_edges = {}
+        for eo_id, species, shape in data["eo_reps"]:
+            for edge, low, high in snap_index.stretches(shape, 1):
+                eo_edges.setdefault(species, []).append((eo_id, edge, low, high))
+        reporter.start("Grouping along the network")
+        species_list = sorted(snaps)
+        tasks = [(snaps[s], data["separation"][s] * 1000, eo_edges.get(s, []), cuts) for s in species_list]
+        results = parallel.map_tasks(network.species_network_groups, tasks, processes, [len(t[0]) for t in tasks], network.set_network, (net,))
+        reporter.start("Assigning SF IDs")
+        shapes = {key: shape for key, species, shape in observations}
+        sf_observations = [(key, species_of[key], 9, shapes[key], False) for key in shapes]
+        grouping.source_feature_groups(sf_observations, data["source_features"], 1, processes)
+
+    wrong = None
+    if n <= check:
+        wrong = 0
+        # each observation should have one snap per vertex within the snap distance of any flowline segment
+        snapped = {}
+        for s in species_list:
+            for key, edge, measure in snaps[s]:
+                snapped[key] = snapped.get(key, 0) + 1
+        bad = 0
+        for key, species, shape in observations:
+            count = sum(1 for part in shape.parts for x, y in part if _segment_distance(snap_index, x, y) <= snap_dist)
+            if count != snapped.get(key, 0):
+                bad += 1
+        wrong += _report_check("snapping", bad, n)
+        network.set_network(net)
+        bad = 0
+        for s, task, groups in zip(species_list, tasks, results):
+            bad += group_mismatches(groups, reference_network_groups(net, task[0], task[1], task[2], cuts))
+        wrong += _report_check("network groups", bad, n)
+    return reporter.phases, wrong
+
+
+def _segment_distance(snap_index, x, y):
+    # distance from (x, y) to the nearest of all of the segments in a SnapIndex
+    dx = snap_index.x1 - snap_index.x0
+    dy = snap_index.y1 - snap_index.y0
+    length2 = dx * dx + dy * dy
+    t = np.clip(((x - snap_index.x0) * dx + (y - snap_index.y0) * dy) / np.where(length2 > 0.0, length2, 1.0), 0.0, 1.0)
+    return float(np.min(np.hypot(x - (snap_index.x0 + t * dx), y - (snap_index.y0 + t * dy))))
+
+
+def main(argv=None):
+    """Runs the benchmarks from the command line and prints a table of phase
+    timings. Returns 1 if any checked result differed from its reference."""
+    parser = argparse.ArgumentParser(description="Benchmark the PNHP grouping engines on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="numbers of observations to run")
+    parser.add_argument("--tools", nargs="+", default=["terrestrial", "rank", "aquatic"], choices=["terrestrial", "rank", "aquatic"],
+                        help="grouping engines to run")
+    parser.add_argument("--species", type=int, default=20, help="number of species in each dataset")
+    parser.add_argument("--seed", type=int, default=1, help="random seed of the synthetic data")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes for the per species grouping")
+    parser.add_argument("--check", type=int, default=2000, help="check results against the reference implementations up to this many observations")
+    parser.add_argument("--trace", help="JSON-lines file to append timing events to")
+    args = parser.parse_args(argv)
+
+    rows = []
+    failed = False
+    for n in args.sizes:
+        for tool in args.tools:
+            print(tool + " grouping, " + str(n) + " observations:")
+            if tool == "terrestrial":
+                phases, wrong = run_terrestrial(n, args.species, args.seed, args.processes, args.check, args.trace)
+            elif tool == "rank":
+                phases, wrong = run_rank_terrestrial(n, args.species, args.seed, args.check, args.trace)
+            else:
+                phases, wrong = run_aquatic(n, args.species, args.seed, args.processes, args.check, args.trace)
+            failed = failed or bool(wrong)
+            for phase, seconds, count in phases:
+                rows.append((tool, n, phase, seconds))
+
+    print("")
+    print("{:<12} {:>8}  {:<32} {:>10}".format("tool", "size", "phase", "seconds"))
+    for tool, n, phase, seconds in rows:
+        print("{:<12} {:>8}  {:<32} {:>10.3f}".format(tool, n, phase, seconds))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,240 @@
+#-------------------------------------------------------------------------------
+# Name:         cache.py
+# Purpose:      On-disk caches for data that is expensive to rebuild and rarely
+#               changes, such as the statewide flowline network and the EO reps
+#               and source features of the monthly Biotics export. Each cache lives
+#               in its own folder with a stamp describing the source it was built
+#               from, and is rebuilt only when that source changes. Per-species
+#               results are cached by the content they were computed from.
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from pnhp_tools import network, reference
+
+# bump when the layout of a cached network, reference layer or result changes so old caches are rebuilt
+NETWORK_VERSION = 3
+REFERENCE_VERSION = 1
+RESULT_VERSION = 1
+
+_NETWORK_ARRAYS = ("node_x", "node_y", "edge_from", "edge_to", "edge_length", "edge_key", "vertex_ptr", "vertex_x", "vertex_y",
+                   "indptr", "indices", "adj_edge")
+
+_REFERENCE_ARRAYS = ("kind", "extent", "part_ptr", "vertex_ptr", "x", "y")
+
+
+def cache_folder(kind, source):
+    """Returns the folder used to cache data of the given kind built from source
+    (usually a catalog path). Caches are kept on the local disk under
+    LOCALAPPDATA (or the temp folder) so network drives are never written to."""
+    root = os.environ.get("LOCALAPPDATA") or tempfile.gettempdir()
+    name = hashlib.sha1(source.lower().encode("utf-8")).hexdigest()[:16]
+    return os.path.join(root, "PNHP", kind, name)
+
+
+def network_folder(folder, stamp):
+    """Returns the folder a network built from the source with this stamp is cached
+    in: a subfolder of folder (from cache_folder()) named for the stamp and the
+    cache version. A changed source is built into a new subfolder, so the old
+    network is never deleted while a process may still have it memory-mapped."""
+    name = hashlib.sha1("{}|{}".format(NETWORK_VERSION, stamp).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(folder, name)
+
+
+def source_stamp(path):
+    """Returns a string that changes whenever the dataset at path is edited. Feature
+    classes inside a geodatabase are not files of their own, so the nearest
+    existing folder or file above path is used and the stamp is its newest
+    modification time. Lock files are ignored because they change whenever the
+    data is opened."""
+    source = path
+    while source and not os.path.exists(source):
+        parent = os.path.dirname(source)
+        if parent == source:
+            break
+        source = parent
+    if os.path.isdir(source):
+        times = [os.path.getmtime(os.path.join(source, f)) for f in os.listdir(source)
+                 if not f.lower().endswith(".lock") and os.path.isfile(os.path.join(source, f))]
+        modified = max(times or [os.path.getmtime(source)])
+    elif os.path.exists(source):
+        modified = os.path.getmtime(source)
+    else:
+        modified = 0
+    return "{}|{:.0f}".format(os.path.normcase(os.path.abspath(path)), modified)
+
+
+def _read_stamp(folder):
+    try:
+        with open(os.path.join(folder, "stamp.json")) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _replace_folder(temp, folder, version, stamp):
+    # writes the stamp last and moves the finished cache into place
+    with open(os.path.join(temp, "stamp.json"), "w") as f:
+        json.dump({"version": version, "stamp": stamp}, f)
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.rename(temp, folder)
+
+
+def _temp_folder(folder):
+    parent = os.path.dirname(folder)
+    if not os.path.exists(parent):
+        os.makedirs(parent)
+    return tempfile.mkdtemp(dir=parent)
+
+
+def save_network(net, folder, stamp):
+    """Writes the arrays of a FlowlineNetwork to folder as .npy files along with a
+    stamp.json recording the cache version and the source stamp. The cache is
+    written to a temporary folder first and then moved into place so a run that
+    stops part way never leaves a half written cache behind."""
+    temp = _temp_folder(folder)
+    dtypes = {"node_x": np.float64, "node_y": np.float64, "edge_length": np.float64, "vertex_x": np.float64, "vertex_y": np.float64}
+    for name in _NETWORK_ARRAYS:
+        np.save(os.path.join(temp, name + ".npy"), np.asarray(getattr(net, name), dtype=dtypes.get(name, np.int64)))
+    _replace_folder(temp, folder, NETWORK_VERSION, stamp)
+
+
+def load_network(folder, stamp=None):
+    """Opens a cached FlowlineNetwork with its arrays memory-mapped, so only the
+    parts of the network a search touches are read from disk. Returns None if
+    there is no cache, it was written by another cache version, or (when stamp is
+    given) it was built from a different version of the source."""
+    saved = _read_stamp(folder)
+    if not saved or saved.get("version") != NETWORK_VERSION:
+        return None
+    if stamp is not None and saved.get("stamp") != stamp:
+        return None
+    arrays = {}
+    for name in _NETWORK_ARRAYS:
+        arrays[name] = np.load(os.path.join(folder, name + ".npy"), mmap_mode="r")
+    return network.FlowlineNetwork(**arrays)
+
+
+def cached_network(folder, stamp, read_flowlines):
+    """Returns the network cached in folder (see network_folder()) if it was built
+    from the source with this stamp. Otherwise builds it with
+    network.build_network() from the flowlines returned by read_flowlines(),
+    caches it for the next run and removes the networks of older versions of the
+    source. The second value returned is True when the cache was used."""
+    net = load_network(folder, stamp)
+    if net is not None:
+        return net, True
+    save_network(network.build_network(read_flowlines()), folder, stamp)
+    _remove_stale(folder)
+    return load_network(folder, stamp), False
+
+
+def _remove_stale(folder):
+    # deletes the networks built next to folder from older versions of the source (and the files of caches
+    # written before networks had their own subfolders); one that is still memory-mapped (Windows will not
+    # delete mapped files) is left for a later run to clean up, and temporary folders of other runs are skipped
+    parent = os.path.dirname(folder)
+    for name in os.listdir(parent):
+        path = os.path.join(parent, name)
+        if path == folder or name.startswith("tmp"):
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def save_reference(layer, folder, stamp):
+    """Writes a reference.ReferenceLayer to folder: its arrays as .npy files and its
+    ids and species codes as ids.json, followed by stamp.json. As with
+    save_network(), the cache is moved into place only once it is complete."""
+    temp = _temp_folder(folder)
+    for name in _REFERENCE_ARRAYS:
+        np.save(os.path.join(temp, name + ".npy"), getattr(layer, name))
+    with open(os.path.join(temp, "ids.json"), "w") as f:
+        json.dump({"ids": layer.ids, "species": layer.species}, f)
+    _replace_folder(temp, folder, REFERENCE_VERSION, stamp)
+
+
+def load_reference(folder, stamp=None):
+    """Opens a cached reference.ReferenceLayer. Returns None if there is no cache,
+    it was written by another cache version, or (when stamp is given) it was
+    built from a different export."""
+    saved = _read_stamp(folder)
+    if not saved or saved.get("version") != REFERENCE_VERSION:
+        return None
+    if stamp is not None and saved.get("stamp") != stamp:
+        return None
+    with open(os.path.join(folder, "ids.json")) as f:
+        columns = json.load(f)
+    arrays = {}
+    for name in _REFERENCE_ARRAYS:
+        arrays[name] = np.load(os.path.join(folder, name + ".npy"))
+    return reference.ReferenceLayer(columns["ids"], columns["species"], **arrays)
+
+
+def cached_reference(folder, stamp, read_features):
+    """Returns the reference layer cached in folder if it was built from the export
+    with this stamp. Otherwise builds it from the (id, species, Shape) list
+    returned by read_features() and caches it for the next run. The second value
+    returned is True when the cache was used."""
+    layer = load_reference(folder, stamp)
+    if layer is not None:
+        return layer, True
+    layer = reference.ReferenceLayer.from_features(read_features())
+    save_reference(layer, folder, stamp)
+    return layer, False
+
+
+def record_digest(*values):
+    """Returns a hash of the given values (coordinates, field values) so an edited
+    record can be told apart from an unchanged one."""
+    return hashlib.sha1(repr(values).encode("utf-8")).hexdigest()
+
+
+def species_key(settings, species, digests):
+    """Returns the content key of the results of one species: a hash of the
+    settings they were computed with, the species and the record_digest() of each
+    of its records. The digests are sorted so the order records are read in does
+    not matter."""
+    h = hashlib.sha1(repr((settings, species)).encode("utf-8"))
+    for digest in sorted(digests):
+        h.update(digest.encode("utf-8"))
+    return h.hexdigest()
+
+
+def load_results(folder):
+    """Returns the dictionary of content key: results saved in folder by
+    save_results(), or an empty dictionary if there is none or it was written by
+    another cache version."""
+    try:
+        with open(os.path.join(folder, "results.json")) as f:
+            saved = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    if saved.get("version") != RESULT_VERSION:
+        return {}
+    return saved.get("results", {})
+
+
+def save_results(folder, results):
+    """Writes a dictionary of content key: results (JSON values) to folder,
+    replacing the earlier file only once the new one is complete."""
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    handle, temp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    with os.fdopen(handle, "w") as f:
+        json.dump({"version": RESULT_VERSION, "results": results}, f)
+    os.replace(temp, os.path.join(folder, "results.json"))
@@ -0,0 +1,225 @@
+#-------------------------------------------------------------------------------
+# Name:         extent.py
+# Purpose:      Range extent of species in memory. Convex hulls of the coordinates
+#               of each species are built with the monotone chain algorithm after a
+#               NumPy prefilter drops the points that cannot be on a hull, so no
+#               copies of the input or minimum bounding geometry layers are needed.
+#               Watershed (HUC) range extents use an index of the watershed
+#               polygons that tags every observation with the watersheds it touches
+#               in one pass instead of a select by location for each species.
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import numpy as np
+
+from pnhp_tools import occupancy, proximity
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def convex_hull(points):
+    """Returns the convex hull of a list of (x, y) points, sorted by x and then y,
+    as a counterclockwise list of vertices starting from the lowest x (monotone
+    chain). Collinear points are left out; fewer than three vertices are returned
+    when the points are all on one line."""
+    if len(points) < 3:
+        return list(points)
+    lower = []
+    for p in points:
+        while len(lower) >= 2 and _cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    upper = []
+    for p in reversed(points):
+        while len(upper) >= 2 and _cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return lower[:-1] + upper[:-1]
+
+
+def _inside_extremes(groups, x, y):
+    # points strictly inside the octagon of their group's extreme points in eight
+    # directions (Akl-Toussaint), which cannot be hull vertices; groups must be sorted
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(groups)) + 1])
+    rank = np.cumsum(np.concatenate([[0], (np.diff(groups) != 0).astype(np.int64)]))
+    position = np.arange(len(x))
+    corners = []
+    for dx, dy in ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)):
+        values = dx * x + dy * y
+        best = np.maximum.reduceat(values, starts)[rank]
+        corners.append(np.minimum.reduceat(np.where(values == best, position, len(x)), starts)[rank])
+    # the corners themselves are kept even when every edge is empty
+    inside = ~np.any(np.array(corners) == position, axis=0)
+    for a, b in zip(corners, corners[1:] + corners[:1]):
+        # corners shared by two directions leave an empty edge that rules nothing out
+        inside &= ((x[b] - x[a]) * (y - y[a]) - (y[b] - y[a]) * (x - x[a]) > 0.0) | (a == b)
+    return inside
+
+
+def group_hulls(groups, x, y):
+    """Returns the convex hull of the points of each group as a dictionary of group
+    number: list of (x, y) vertices (see convex_hull()). groups holds the group
+    number (usually the species) of each point. The points of all groups are
+    prefiltered and sorted in one pass before the hulls are built."""
+    groups = np.asarray(groups, dtype=np.int64)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if not len(groups):
+        return {}
+    order = np.argsort(groups, kind="stable")
+    groups, x, y = groups[order], x[order], y[order]
+    keep = ~_inside_extremes(groups, x, y)
+    groups, x, y = groups[keep], x[keep], y[keep]
+    order = np.lexsort((y, x, groups))
+    groups, x, y = groups[order], x[order], y[order]
+    bounds = np.flatnonzero(np.diff(groups)) + 1
+    hulls = {}
+    for start, end in zip(np.concatenate([[0], bounds]).tolist(), np.concatenate([bounds, [len(groups)]]).tolist()):
+        points = list(zip(x[start:end].tolist(), y[start:end].tolist()))
+        # drop repeated points so they do not reach the chain
+        points = [p for i, p in enumerate(points) if i == 0 or p != points[i - 1]]
+        hulls[int(groups[start])] = convex_hull(points)
+    return hulls
+
+
+def coverage_hulls(groups, coverage):
+    """Returns the convex hull of the vertices of the observations of each group,
+    as group_hulls() does, for the observations of an occupancy.Coverage. groups
+    holds the group number of each observation."""
+    owner, x, y = coverage.vertices()
+    return group_hulls(np.asarray(groups, dtype=np.int64)[owner], x, y)
+
+
+def _distinct_pairs(first, second, count):
+    # distinct (first, second) pairs where second is less than count
+    key = np.sort(first.astype(np.int64) * count + second)
+    if len(key):
+        key = key[np.append(True, key[1:] != key[:-1])]
+    return key // count, key % count
+
+
+def locate_points(x, y, edges, edge_owner, count, block=1000000):
+    """Returns the (point, polygon) pairs of the points in x and y that are inside
+    polygons, as two arrays. edges is an (n, 4) array of the ring edges of count
+    polygons and edge_owner the polygon number of each edge.
+
+    The edges are put in horizontal bands about one edge tall, so each point only
+    meets the few edges in its band, and a ray is cast to the right of the point
+    through those edges; an odd number of crossings of a polygon's edges means the
+    point is inside it (even-odd, so holes are left out). Points are handled in
+    blocks that give at most about block point-edge pairs at a time."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    found = [np.zeros(0, dtype=np.int64)]
+    if not len(edges) or not len(x):
+        return found[0], found[0]
+    low = np.minimum(edges[:, 1], edges[:, 3])
+    high = np.maximum(edges[:, 1], edges[:, 3])
+    bottom = float(low.min())
+    height = max(float(np.median(high - low)), (float(high.max()) - bottom) / len(edges), 1e-9)
+    first = np.floor((low - bottom) / height).astype(np.int64)
+    edge, offset = occupancy.expand(np.floor((high - bottom) / height).astype(np.int64) - first + 1)
+    band = first[edge] + offset
+    order = np.argsort(band, kind="stable")
+    band = band[order]
+    edge = edge[order]
+    point_band = np.floor((y - bottom) / height).astype(np.int64)
+    start = np.searchsorted(band, point_band, "left")
+    count_in_band = np.searchsorted(band, point_band, "right") - start
+    ends = np.cumsum(count_in_band)
+    i = 0
+    while i < len(x):
+        j = max(int(np.searchsorted(ends, ends[i - 1] + block if i else block, "right")), i + 1)
+        point, offset = occupancy.expand(count_in_band[i:j])
+        point += i
+        e = edge[start[point] + offset]
+        x0, y0, x1, y1 = edges[e, 0], edges[e, 1], edges[e, 2], edges[e, 3]
+        py = y[point]
+        spans = (y0 > py) != (y1 > py)
+        crossing = spans & (x[point] < x0 + (py - y0) * (x1 - x0) / np.where(spans, y1 - y0, 1.0))
+        key = np.sort(point[crossing] * count + edge_owner[e[crossing]])
+        if len(key):
+            # keys crossed an odd number of times
+            new = np.ones(len(key), dtype=bool)
+            new[1:] = key[1:] != key[:-1]
+            runs = np.diff(np.append(np.flatnonzero(new), len(key)))
+            found.append(key[new][runs % 2 == 1])
+        i = j
+    key = np.concatenate(found)
+    return key // count, key % count
+
+
+def _segment_pairs(a, b, size):
+    # (row of a, row of b) for the segments of a and b that touch or cross, found
+    # by rasterizing both to a grid and only measuring segments that share a cell
+    cells = []
+    for segments in (a, b):
+        rows = np.arange(len(segments))
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.float64))
+        coverage = occupancy.Coverage(len(segments), empty, (rows, segments), (rows[:0], segments[:0]))
+        cells.append(coverage.cells(size, (0.0, 0.0)))
+    (a_row, a_col, a_cell_row), (b_row, b_col, b_cell_row) = cells
+    a_key = a_col * (1 << 32) + a_cell_row
+    b_key = b_col * (1 << 32) + b_cell_row
+    order = np.argsort(b_key, kind="stable")
+    b_key = b_key[order]
+    b_row = b_row[order]
+    start = np.searchsorted(b_key, a_key, "left")
+    entry, offset = occupancy.expand(np.searchsorted(b_key, a_key, "right") - start)
+    first, second = _distinct_pairs(a_row[entry], b_row[start[entry] + offset], len(b))
+    touching = proximity.pair_distance(a[first], b[second]) == 0.0
+    return first[touching], second[touching]
+
+
+class PolygonIndex(object):
+    """Polygons (such as HUC08 watersheds) held as edge arrays for finding the ones
+    each observation touches. shapes is a list of polygon geometry.Shape objects;
+    polygons are numbered in list order."""
+
+    def __init__(self, shapes):
+        self.count = len(shapes)
+        self.coverage = occupancy.Coverage.from_shapes(shapes)
+        self.extent = np.array([shape.extent for shape in shapes], dtype=np.float64).reshape(-1, 4)
+        self.first = np.array([shape.parts[0][0] for shape in shapes], dtype=np.float64).reshape(-1, 2)
+
+    def points(self, x, y):
+        """Returns the (point, polygon) pairs of the points inside polygons."""
+        return locate_points(x, y, self.coverage.edges, self.coverage.edge_owner, self.count)
+
+    def intersecting(self, coverage):
+        """Returns the distinct (observation, polygon) pairs of the observations of an
+        occupancy.Coverage and the polygons they touch, as two arrays. An
+        observation touches a polygon if one of its vertices is inside it, one of
+        its segments touches or crosses the polygon's boundary, or it is a polygon
+        that surrounds the whole polygon."""
+        first = []
+        second = []
+        owner, x, y = coverage.vertices()
+        vertex, polygon = self.points(x, y)
+        first.append(owner[vertex])
+        second.append(polygon)
+        edges = self.coverage.edges
+        if len(coverage.segments) and len(edges):
+            length = np.concatenate([np.hypot(s[:, 2] - s[:, 0], s[:, 3] - s[:, 1]) for s in (coverage.segments, edges)])
+            segment, edge = _segment_pairs(coverage.segments, edges, max(float(np.median(length)), 1e-9))
+            first.append(coverage.segment_owner[segment])
+            second.append(self.coverage.edge_owner[edge])
+        if len(coverage.edges) and self.count:
+            polygon, observation = locate_points(self.first[:, 0], self.first[:, 1], coverage.edges, coverage.edge_owner, coverage.count)
+            first.append(observation)
+            second.append(polygon)
+        return _distinct_pairs(np.concatenate(first), np.concatenate(second), max(self.count, 1))
+
+    def group_polygons(self, groups, coverage):
+        """Returns a dictionary of group number: sorted list of the numbers of the
+        polygons touched by the observations of that group. groups holds the group
+        number of each observation in coverage."""
+        observation, polygon = self.intersecting(coverage)
+        group, polygon = _distinct_pairs(np.asarray(groups, dtype=np.int64)[observation], polygon, max(self.count, 1))
+        found = {}
+        for g, p in zip(group.tolist(), polygon.tolist()):
+            found.setdefault(g, []).append(p)
+        return found
@@ -0,0 +1,148 @@
+#-------------------------------------------------------------------------------
+# Name:         geometry.py
+# Purpose:      Lightweight point/line/polygon shapes and planar distance functions
+#               used by the in-memory grouping engines. Shapes are built once from
+#               arcpy geometries and then compared without any geoprocessing calls.
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import math
+
+
+class Shape(object):
+    """Planar geometry held as plain coordinate lists. kind is "point", "line" or
+    "polygon"; parts is a list of vertex lists (polygon rings, including holes,
+    are stored as separate closed parts); extent is (xmin, ymin, xmax, ymax)."""
+    __slots__ = ("kind", "parts", "extent")
+
+    def __init__(self, kind, parts):
+        self.kind = kind
+        self.parts = [[(float(x), float(y)) for x, y in part] for part in parts if part]
+        xs = [p[0] for part in self.parts for p in part]
+        ys = [p[1] for part in self.parts for p in part]
+        self.extent = (min(xs), min(ys), max(xs), max(ys))
+
+    def __getstate__(self):
+        return (self.kind, self.parts, self.extent)
+
+    def __setstate__(self, state):
+        self.kind, self.parts, self.extent = state
+
+
+def from_arcpy(geom, scale=1.0):
+    """Converts an arcpy geometry object (from a SHAPE@ token) to a Shape. Returns
+    None for empty geometries so callers can skip records without a shape. The
+    coordinates are multiplied by scale, e.g. the metersPerUnit of a projected
+    spatial reference in feet, so distances between shapes come out in meters."""
+    if geom is None or geom.pointCount == 0:
+        return None
+    if geom.type == "point":
+        return Shape("point", [[(geom.firstPoint.X * scale, geom.firstPoint.Y * scale)]])
+    if geom.type == "multipoint":
+        return Shape("point", [[(pnt.X * scale, pnt.Y * scale)] for pnt in geom])
+    kind = "polygon" if geom.type == "polygon" else "line"
+    parts = []
+    for part in geom:
+        # polygon parts use None to separate the outer ring from interior rings
+        ring = []
+        for pnt in part:
+            if pnt is None:
+                parts.append(ring)
+                ring = []
+            else:
+                ring.append((pnt.X * scale, pnt.Y * scale))
+        parts.append(ring)
+    return Shape(kind, parts)
+
+
+def extent_distance(a, b):
+    """Returns the distance between two extents, or 0 if they overlap."""
+    dx = max(a[0] - b[2], b[0] - a[2], 0.0)
+    dy = max(a[1] - b[3], b[1] - a[3], 0.0)
+    return math.hypot(dx, dy)
+
+
+def _segments(shape):
+    for part in shape.parts:
+        if len(part) == 1:
+            yield part[0], part[0]
+        else:
+            for i in range(len(part) - 1):
+                yield part[i], part[i + 1]
+
+
+def _point_segment(p, a, b):
+    dx = b[0] - a[0]
+    dy = b[1] - a[1]
+    length2 = dx * dx + dy * dy
+    if length2 == 0.0:
+        return math.hypot(p[0] - a[0], p[1] - a[1])
+    t = ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length2
+    t = min(1.0, max(0.0, t))
+    return math.hypot(p[0] - (a[0] + t * dx), p[1] - (a[1] + t * dy))
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def _segment_segment(a, b, c, d):
+    # segments that properly cross are zero distance apart
+    d1 = _cross(c, d, a)
+    d2 = _cross(c, d, b)
+    d3 = _cross(a, b, c)
+    d4 = _cross(a, b, d)
+    if ((d1 > 0 > d2) or (d1 < 0 < d2)) and ((d3 > 0 > d4) or (d3 < 0 < d4)):
+        return 0.0
+    return min(_point_segment(a, c, d), _point_segment(b, c, d),
+               _point_segment(c, a, b), _point_segment(d, a, b))
+
+
+def contains_point(shape, p):
+    """Even-odd point in polygon test over all rings of a polygon shape."""
+    inside = False
+    x, y = p
+    for ring in shape.parts:
+        for i in range(len(ring) - 1):
+            x1, y1 = ring[i]
+            x2, y2 = ring[i + 1]
+            if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+                inside = not inside
+    return inside
+
+
+def _inside(a, b):
+    # true if any part of b starts inside polygon a; partial overlaps are caught by the segment test
+    return a.kind == "polygon" and any(contains_point(a, part[0]) for part in b.parts)
+
+
+def distance(a, b):
+    """Returns the minimum planar distance between two shapes. Shapes that touch,
+    cross or contain one another are zero distance apart."""
+    if _inside(a, b) or _inside(b, a):
+        return 0.0
+    best = float("inf")
+    for s1 in _segments(a):
+        for s2 in _segments(b):
+            d = _segment_segment(s1[0], s1[1], s2[0], s2[1])
+            if d < best:
+                best = d
+                if best == 0.0:
+                    return best
+    return best
+
+
+def within(a, b, radius):
+    """Returns True if shapes a and b are within radius of each other. The extent
+    check and the early exit keep this much cheaper than distance() for pairs that
+    are far apart or clearly close."""
+    if extent_distance(a.extent, b.extent) > radius:
+        return False
+    if _inside(a, b) or _inside(b, a):
+        return True
+    for s1 in _segments(a):
+        for s2 in _segments(b):
+            if _segment_segment(s1[0], s1[1], s2[0], s2[1]) <= radius:
+                return True
+    return False
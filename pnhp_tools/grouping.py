@@ -0,0 +1,412 @@
+#-------------------------------------------------------------------------------
+# Name:         grouping.py
+# Purpose:      In-memory separation distance grouping for the bulk load and rank
+#               calculator toolboxes. Observation geometries are loaded once into a
+#               uniform grid index kept separately for each species, and "everything
+#               within separation distance" questions are answered from memory
+#               instead of with select by location calls.
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import math
+
+import numpy as np
+
+from pnhp_tools import geometry, parallel, proximity
+
+
+class GridIndex(object):
+    """Uniform grid of shape extents, keyed by species so that queries never return
+    features of another species. cell_size should be about the largest search
+    radius that will be used so a query only visits a handful of cells."""
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size) if cell_size and cell_size > 0 else 1.0
+        self.cells = {}
+        self.shapes = {}
+
+    def _cell_range(self, extent, radius=0.0):
+        size = self.cell_size
+        return (int(math.floor((extent[0] - radius) / size)), int(math.floor((extent[1] - radius) / size)),
+                int(math.floor((extent[2] + radius) / size)), int(math.floor((extent[3] + radius) / size)))
+
+    def insert(self, key, species, shape):
+        """Adds a shape to the index under the given key and species."""
+        self.shapes[key] = shape
+        grid = self.cells.setdefault(species, {})
+        x0, y0, x1, y1 = self._cell_range(shape.extent)
+        for i in range(x0, x1 + 1):
+            for j in range(y0, y1 + 1):
+                grid.setdefault((i, j), []).append(key)
+
+    def candidates(self, species, extent, radius):
+        """Returns the keys of all indexed shapes of species whose extent is within
+        radius of the given extent."""
+        grid = self.cells.get(species)
+        if not grid:
+            return set()
+        found = set()
+        x0, y0, x1, y1 = self._cell_range(extent, radius)
+        for i in range(x0, x1 + 1):
+            for j in range(y0, y1 + 1):
+                for key in grid.get((i, j), ()):
+                    if key not in found and geometry.extent_distance(self.shapes[key].extent, extent) <= radius:
+                        found.add(key)
+        return found
+
+    def query(self, species, shape, radius):
+        """Returns the keys of all indexed shapes of species within radius of shape."""
+        return {key for key in self.candidates(species, shape.extent, radius)
+                if geometry.within(self.shapes[key], shape, radius)}
+
+
+class UnionFind(object):
+    """Disjoint-set forest used to label connected groups of observations. Keys are
+    any hashable values; components are reported in the order keys were added."""
+
+    def __init__(self, keys=()):
+        self.parent = {}
+        self.rank = {}
+        for key in keys:
+            self.add(key)
+
+    def add(self, key):
+        if key not in self.parent:
+            self.parent[key] = key
+            self.rank[key] = 0
+
+    def find(self, key):
+        parent = self.parent
+        while parent[key] != key:
+            # path halving keeps the trees nearly flat
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return a
+        if self.rank[a] < self.rank[b]:
+            a, b = b, a
+        self.parent[b] = a
+        if self.rank[a] == self.rank[b]:
+            self.rank[a] += 1
+        return a
+
+    def components(self):
+        """Returns a list of components, each a list of keys. Components are ordered
+        by their first key and keys keep the order they were added in, so the result
+        does not depend on how the unions were made."""
+        groups = {}
+        for key in self.parent:
+            groups.setdefault(self.find(key), []).append(key)
+        return list(groups.values())
+
+
+def search_radii(separation, uncertainty_type=None, uncertainty_distance=None):
+    """Returns the search radius in meters of each observation as a NumPy array:
+    the separation distance in kilometers times 1000, plus the locational
+    uncertainty distance for records whose uncertainty type is "estimated". The
+    arguments are parallel lists; the uncertainty lists may be left out."""
+    radii = np.array(separation, dtype=np.float64) * 1000
+    if uncertainty_type is not None and uncertainty_distance is not None:
+        estimated = np.array([bool(t) and str(t).lower() == "estimated" for t in uncertainty_type], dtype=bool)
+        radii[estimated] += np.array([d or 0.0 for d in uncertainty_distance], dtype=np.float64)[estimated]
+    return radii
+
+
+def neighbor_pairs(extents, radii, groups=None):
+    """Finds every pair of features whose extents are within the larger of their
+    two search radii, in one pass over NumPy arrays. extents is an (n, 4) array of
+    (xmin, ymin, xmax, ymax) and radii an array of n radii. groups is an optional
+    array of n group numbers (such as species); only features of the same group
+    are paired. Each feature is listed in the cells of a uniform grid that its
+    extent covers and looks in the cells its own radius reaches, and each pair is
+    tested from whichever feature has the larger radius. Each group has its own
+    grid whose cell size is the group's largest radius (or the typical feature
+    size, if larger), so the grid suits the radii of the features being grouped.
+    Returns two arrays (first, second) of row numbers with first < second, sorted."""
+    extents = np.asarray(extents, dtype=np.float64).reshape(-1, 4)
+    radii = np.asarray(radii, dtype=np.float64)
+    n = len(radii)
+    groups = np.zeros(n, dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    group_radius = np.zeros(groups.max() + 1)
+    np.maximum.at(group_radius, groups, radii)
+    typical = float(np.median(np.maximum(extents[:, 2] - extents[:, 0], extents[:, 3] - extents[:, 1])))
+    size = np.maximum(group_radius, max(typical, 1.0))[groups]
+
+    def cells(e):
+        cx0 = np.floor(e[:, 0] / size).astype(np.int64)
+        cy0 = np.floor(e[:, 1] / size).astype(np.int64)
+        nx = np.floor(e[:, 2] / size).astype(np.int64) - cx0 + 1
+        ny = np.floor(e[:, 3] / size).astype(np.int64) - cy0 + 1
+        count = nx * ny
+        row = np.repeat(np.arange(len(e)), count)
+        offset = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        return cx0[row] + offset % nx[row], cy0[row] + offset // nx[row], row
+
+    listed_x, listed_y, listed_row = cells(extents)
+    search_x, search_y, search_row = cells(extents + np.column_stack((-radii, -radii, radii, radii)))
+    # number the cells densely so group and cell pack into one int64 key however spread out the data is
+    listed = len(listed_row)
+    group = groups[np.concatenate((listed_row, search_row))]
+    cx = np.unique(np.concatenate((listed_x, search_x)), return_inverse=True)[1]
+    column = np.unique(group * (int(cx.max()) + 1) + cx, return_inverse=True)[1]
+    cy = np.unique(np.concatenate((listed_y, search_y)), return_inverse=True)[1]
+    key = column.astype(np.int64) * (int(cy.max()) + 1) + cy
+
+    # cells each feature is listed in, sorted so the features of a cell are one slice
+    listed_key = key[:listed]
+    order = np.argsort(listed_key, kind="stable")
+    listed_key = listed_key[order]
+    listed_row = listed_row[order]
+
+    # cells each feature searches, joined to the features listed in them
+    search_key = key[listed:]
+    start = np.searchsorted(listed_key, search_key, side="left")
+    count = np.searchsorted(listed_key, search_key, side="right") - start
+    a = np.repeat(search_row, count)
+    b = listed_row[np.repeat(start - np.cumsum(count) + count, count) + np.arange(count.sum())]
+
+    # each pair only needs testing from the feature with the larger radius (the lower row on a tie)
+    ra = radii[a]
+    rb = radii[b]
+    keep = (ra > rb) | ((ra == rb) & (a < b))
+    a = a[keep]
+    b = b[keep]
+    ra = ra[keep]
+    # keep pairs whose extents are within that radius, then each pair once
+    xmin, ymin, xmax, ymax = (np.ascontiguousarray(extents[:, i]) for i in range(4))
+    dx = np.maximum(np.maximum(xmin[a] - xmax[b], xmin[b] - xmax[a]), 0.0)
+    dy = np.maximum(np.maximum(ymin[a] - ymax[b], ymin[b] - ymax[a]), 0.0)
+    close = dx * dx + dy * dy <= ra * ra
+    pair = np.sort(np.minimum(a[close], b[close]) * n + np.maximum(a[close], b[close]))
+    pair = pair[np.append(True, pair[1:] != pair[:-1])] if len(pair) else pair
+    return pair // n, pair % n
+
+
+def pair_labels(n, first, second):
+    """Labels the connected components of n rows linked by the pairs (first,
+    second) with NumPy, hooking the root of each pair onto the smaller root and
+    following the links to the root until nothing changes. Returns an array giving
+    the smallest row of each row's component."""
+    labels = np.arange(n)
+    while len(first):
+        low = np.minimum(labels[first], labels[second])
+        hooked = labels.copy()
+        np.minimum.at(hooked, labels[first], low)
+        np.minimum.at(hooked, labels[second], low)
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            break
+        labels = hooked
+    return labels
+
+
+def cluster_rows(groups, radii, extents, shapes=None):
+    """Groups rows held in arrays into connected components in one pass over all
+    groups (species). groups holds a group number for each row, radii its search
+    radius and extents its (xmin, ymin, xmax, ymax). shapes is the list of each
+    row's Shape, or None when every row is a single point, in which case no
+    geometry objects are needed at all.
+
+    Candidate pairs come from neighbor_pairs(). Pairs of single points are linked
+    straight from that test, which is exact for them, with pair_labels(); other
+    pairs are measured with geometry.within() unless they are already connected.
+    Returns an array giving the smallest row of each row's component."""
+    radii = np.asarray(radii, dtype=np.float64)
+    n = len(radii)
+    first, second = neighbor_pairs(extents, radii, groups)
+    if shapes is None:
+        return pair_labels(n, first, second)
+    point = np.array([shape.kind == "point" and len(shape.parts) == 1 for shape in shapes], dtype=bool)
+    both = point[first] & point[second]
+    labels = pair_labels(n, first[both], second[both])
+    if both.all():
+        return labels
+    uf = UnionFind(range(n))
+    for a in np.flatnonzero(labels != np.arange(n)).tolist():
+        uf.union(a, int(labels[a]))
+    reach = np.maximum(radii[first], radii[second])
+    for a, b, radius in zip(first[~both].tolist(), second[~both].tolist(), reach[~both].tolist()):
+        if uf.find(a) != uf.find(b) and geometry.within(shapes[b], shapes[a], radius):
+            uf.union(a, b)
+    roots = np.array([uf.find(a) for a in range(n)], dtype=np.int64)
+    smallest = np.full(n, n, dtype=np.int64)
+    np.minimum.at(smallest, roots, np.arange(n))
+    return smallest[roots]
+
+
+def cluster(observations):
+    """Groups observations into connected components by separation distance.
+
+    observations is an ordered list of (key, species, radius, shape) tuples, where
+    each observation has its own radius (see search_radii()). Two observations are
+    linked when they are the same species and within the larger of their two
+    radii; chains of linked observations form one component. All species are
+    grouped together with cluster_rows(). Returns a list of components, each a
+    list of keys, ordered by their first key with keys in their original order,
+    as UnionFind.components() does."""
+    species = {}
+    groups = [species.setdefault(o[1], len(species)) for o in observations]
+    shapes = [o[3] for o in observations]
+    labels = cluster_rows(groups, [o[2] for o in observations], [shape.extent for shape in shapes], shapes)
+    components = {}
+    for o, label in zip(observations, labels.tolist()):
+        components.setdefault(label, []).append(o[0])
+    return list(components.values())
+
+
+def cluster_by_species(observations, processes=1):
+    """Runs cluster() separately for each species, in a process pool if processes
+    is greater than 1. Returns the components of every species, species in sorted
+    order, so the result is the same however many processes are used."""
+    tasks = [records for species, records in parallel.partition_by_species(observations)]
+    components = []
+    for result in parallel.map_tasks(cluster, tasks, processes, [len(t) for t in tasks]):
+        components.extend(result)
+    return components
+
+
+def species_eo_groups(task):
+    """Groups the observations of one species and looks up the existing EO reps (or
+    source features) near each group. task is (observations, eo_reps) with
+    observations as (key, species, distance, shape) and eo_reps as (eo_id,
+    species, shape), all for one species. Returns a list of (members, eoid) where
+    eoid is "" if no EO rep is within separation distance of any member."""
+    observations, eo_reps = task
+    lookup = {o[0]: o for o in observations}
+    eo_index = proximity.FeatureIndex()
+    eo_ids = {}
+    for n, (eo_id, species, shape) in enumerate(eo_reps):
+        eo_index.insert(n, species, shape)
+        eo_ids[n] = eo_id
+
+    groups = []
+    for members in cluster(observations):
+        # check for existing EO reps within separation distance of any member of the group
+        found = set()
+        for key in members:
+            key, species, distance, shape = lookup[key]
+            found.update(eo_index.query(species, shape, distance))
+        groups.append((members, ",".join(sorted({str(int(eo_ids[n])) for n in found}))))
+    return groups
+
+
+def _key_order(key):
+    # join ids are numbers held as text, so compare them as numbers when they are
+    return (0, int(key), "") if str(key).isdigit() else (1, 0, str(key))
+
+
+def group_label(species, members):
+    """Returns the stable label of a new group: its species and its smallest member
+    key (join ids compared as numbers). The label depends only on what is in the
+    group, so it is the same however the observations were ordered or split up
+    between processes."""
+    return (str(species), _key_order(min(members, key=_key_order)))
+
+
+def number_groups(labels, word_index, prefix):
+    """Gives each group label from group_label() a grouping string, numbering them
+    densely from word_index in label order (species, then smallest key). Returns
+    a dictionary of label: string and the next unused word index."""
+    names = {}
+    for label in sorted(labels):
+        names[label] = prefix + str(word_index)
+        word_index += 1
+    return names, word_index
+
+
+def assign_groups(observations, features, word_index, processes, fields, prefix):
+    # groups unassigned observations per species and gives each group the ids of the
+    # nearby features or a new grouping string, numbering new groups after the merge
+    pending = [(o[0], o[1], o[2], o[3]) for o in observations if not o[4]]
+    by_species = {}
+    for feature in features:
+        by_species.setdefault(feature[1], []).append(feature)
+    partitions = parallel.partition_by_species(pending)
+    tasks = [(records, by_species.get(species, [])) for species, records in partitions]
+
+    results = {}
+    new_groups = {}
+    for (species, records), groups in zip(partitions, parallel.map_tasks(species_eo_groups, tasks, processes, [len(t[0]) for t in tasks])):
+        for members, ids in groups:
+            if ids:
+                for key in members:
+                    results[key] = (fields[0], ids)
+            else:
+                new_groups[group_label(species, members)] = members
+    names, word_index = number_groups(new_groups, word_index, prefix)
+    for label, members in new_groups.items():
+        for key in members:
+            results[key] = (fields[1], names[label])
+    return results, word_index
+
+
+def terrestrial_eo_groups(observations, eo_reps, word_index=1, processes=1):
+    """Assigns existing EO IDs or new EO grouping strings to observations in the
+    bulk load Terrestrial tool.
+
+    observations is an ordered list of (key, species, distance, shape, assigned)
+    tuples where distance is the separation distance in meters (already including
+    any locational uncertainty distance) and assigned is True if the record already
+    has an EO_ID or EO_NEW value. Assigned records keep their values and are left
+    out of the grouping. eo_reps is a list of (eo_id, species, shape).
+
+    Unassigned observations are clustered with cluster(). A group gets the EO IDs of
+    all EO reps of its species within separation distance of any of its members,
+    or a new "new_eo_" string if there are none. The tool used to buffer features by
+    1 m and select within distance-1 (EO reps) and distance-2 (observations), which
+    is the same as a true distance of no more than distance between the unbuffered
+    shapes, so distance is used directly here.
+
+    Each species is grouped on its own with species_eo_groups(), in a process pool
+    if processes is greater than 1. New groups are labelled by their species and
+    smallest key (group_label()) and numbered densely after the merge, so the
+    strings are unique across the run and do not depend on the order of the
+    observations or how the work was split up.
+
+    Returns a dictionary of key: (field, value) where field is "EO_ID" or "EO_NEW",
+    along with the next unused word index."""
+    return assign_groups(observations, eo_reps, word_index, processes, ("EO_ID", "EO_NEW"), "new_eo_")
+
+
+def source_feature_groups(observations, source_features, word_index=1, processes=1):
+    """Assigns existing SF IDs or new SF grouping strings to observations in the
+    bulk load tools, the same way terrestrial_eo_groups() assigns EOs.
+
+    observations is an ordered list of (key, species, distance, shape, assigned)
+    where assigned is True if the record already has an SF_ID or SF_NEW value, and
+    source_features is a list of (sf_id, species, shape). The tools used to buffer
+    both layers by 1 m and select within 7 m, which is a true distance of 9 m, so
+    distance should be 9. Returns a dictionary of key: (field, value) where field
+    is "SF_ID" or "SF_NEW", along with the next unused word index."""
+    return assign_groups(observations, source_features, word_index, processes, ("SF_ID", "SF_NEW"), "new_sf_")
+
+
+def unique_ids(assignments):
+    """Numbers the source features of the observations for the UNIQUEID field the
+    way the bulk load tools always have: existing SF IDs in sorted order, then new
+    SF strings in sorted order, starting from 1. assignments is a dictionary of
+    key: (sf_id, sf_new, ...); a record with an SF_NEW value takes that number.
+    Returns a dictionary of key: uniqueid for every record with an SF value."""
+    sf_ids = sorted({str(a[0]) for a in assignments.values() if a[0] is not None})
+    sf_new = sorted({a[1] for a in assignments.values() if a[1] is not None})
+    numbers = {("SF_ID", value): n for n, value in enumerate(sf_ids, 1)}
+    numbers.update({("SF_NEW", value): n for n, value in enumerate(sf_new, len(sf_ids) + 1)})
+    result = {}
+    for key, a in assignments.items():
+        if a[1] is not None:
+            result[key] = numbers[("SF_NEW", a[1])]
+        elif a[0] is not None:
+            result[key] = numbers[("SF_ID", str(a[0]))]
+    return result
@@ -0,0 +1,145 @@
+#-------------------------------------------------------------------------------
+# Name:         incremental.py
+# Purpose:      Incremental re-runs of the bulk load grouping. A sidecar state file
+#               records what each observation looked like and which group it was
+#               given, so a later run only re-groups observations that are new or
+#               changed and the groups they touch.
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import re
+import struct
+import tempfile
+
+from pnhp_tools import geometry, grouping
+
+# bump when the layout of the state file changes so old files are ignored
+STATE_VERSION = 1
+
+# fields and new grouping string prefix of each grouping pass
+PASSES = {"eo": (("EO_ID", "EO_NEW"), "new_eo_"), "sf": (("SF_ID", "SF_NEW"), "new_sf_")}
+
+
+def shape_hash(shape):
+    """Returns a hash of a Shape's kind and coordinates (to the millimeter) so an
+    edited geometry can be told apart from an unchanged one."""
+    h = hashlib.sha1(shape.kind.encode("utf-8"))
+    for part in shape.parts:
+        h.update(b"|")
+        for x, y in part:
+            h.update(struct.pack("<qq", int(round(x * 1000)), int(round(y * 1000))))
+    return h.hexdigest()
+
+
+def load_state(path, stamp):
+    """Reads a state file written by save_state(). Returns the dictionary of
+    records and whether it was written against the same reference data (stamp),
+    or None and False if there is no file or it was written by another version.
+    The records are returned either way, since they still tell which values the
+    tool wrote and which were assigned by hand."""
+    if not path or not os.path.exists(path):
+        return None, False
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None, False
+    if state.get("version") != STATE_VERSION:
+        return None, False
+    return state.get("records", {}), state.get("stamp") == stamp
+
+
+def save_state(path, stamp, records):
+    """Writes the state file, replacing any earlier one only once the new file is
+    complete. records is a dictionary of stable key: record, where a record holds
+    the join_id, geometry hash and species of the observation and, under "eo"
+    and "sf", the [field, value, distance] each pass gave it."""
+    folder = os.path.dirname(os.path.abspath(path))
+    handle, temp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    with os.fdopen(handle, "w") as f:
+        json.dump({"version": STATE_VERSION, "stamp": stamp, "records": records}, f)
+    os.replace(temp, path)
+
+
+def _word_number(value, prefixes):
+    for prefix in prefixes:
+        match = re.match(re.escape(prefix) + r"(\d+)$", str(value))
+        if match:
+            return int(match.group(1))
+    return 0
+
+
+def regroup(observations, features, previous, word_index=1, processes=1, kind="eo", keep_groups=True):
+    """Runs one grouping pass (kind "eo" or "sf") re-using the groups of a previous
+    run wherever they cannot have changed.
+
+    observations is a list of (key, species, distance, shape, current, shape_hash)
+    where current is the (field, value) the record holds now, or None. previous is
+    a dictionary of key: record from the state file. A record whose current value
+    is not the one this tool gave it last time was assigned by hand and is left
+    alone, as assigned records always have been.
+
+    When keep_groups is False (the reference data changed since the previous run)
+    every observation that is not assigned by hand is re-grouped. Otherwise an
+    observation is re-grouped if it is new, its geometry, species or distance
+    changed, or it was in a group that lost a member or is now within reach of a
+    new or changed observation. Groups are connected components, so every other
+    group is exactly what a full run would produce and keeps its value. Re-grouped
+    observations are assigned with grouping.assign_groups() and new strings are
+    numbered after the largest one already in use.
+
+    Returns a dictionary of key: (field, value) for every observation that was not
+    assigned by hand, the next unused word index, and the number of observations
+    that were re-grouped."""
+    fields, prefix = PASSES[kind]
+    prefixes = [p[1] for p in PASSES.values()]
+    lookup = {o[0]: o for o in observations}
+
+    kept = {}
+    changed = []
+    dirty = set()
+    for key, species, distance, shape, current, digest in observations:
+        word_index = max(word_index, _word_number(current[1], prefixes) + 1) if current else word_index
+        old = previous.get(key)
+        old_value = tuple(old[kind][:2]) if old and old.get(kind) else None
+        if current is not None and current != old_value:
+            # assigned by hand; the group it used to be in has lost a member
+            if old_value:
+                dirty.add(old_value)
+            continue
+        if keep_groups and old_value and old["hash"] == digest and old["species"] == species and old[kind][2] == distance:
+            kept[key] = old_value
+        else:
+            changed.append(key)
+            if old_value:
+                dirty.add(old_value)
+    # groups that lost a member since the last run
+    for key, old in previous.items():
+        if key not in lookup and old.get(kind):
+            dirty.add(tuple(old[kind][:2]))
+
+    # groups of unchanged observations within reach of a new or changed one
+    max_radius = {}
+    for key in kept:
+        species, distance = lookup[key][1], lookup[key][2]
+        max_radius[species] = max(distance, max_radius.get(species, 0.0))
+    index = grouping.GridIndex(max(max_radius.values() or [1.0]))
+    for key in kept:
+        index.insert(key, lookup[key][1], lookup[key][3])
+    for key in changed:
+        species, distance, shape = lookup[key][1], lookup[key][2], lookup[key][3]
+        for other in index.candidates(species, shape.extent, max(distance, max_radius.get(species, 0.0))):
+            if kept[other] not in dirty and geometry.within(index.shapes[other], shape, max(distance, lookup[other][2])):
+                dirty.add(kept[other])
+
+    redo = set(changed) | {key for key, value in kept.items() if value in dirty}
+    pending = [lookup[key][:4] + (False,) for key in lookup if key in redo]
+    results, word_index = grouping.assign_groups(pending, features, word_index, processes, fields, prefix)
+    for key, value in kept.items():
+        if key not in redo:
+            results[key] = value
+    return results, word_index, len(redo)
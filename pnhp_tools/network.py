@@ -0,0 +1,336 @@
+#-------------------------------------------------------------------------------
+# Name:         network.py
+# Purpose:      Stream network engine for aquatic grouping. The NHD flowlines are
+#               loaded once into an undirected graph held in adjacency arrays, and
+#               bounded multi-source Dijkstra searches from the snapped observations
+#               replace the per-species Network Analyst service area solves.
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import bisect
+import heapq
+import math
+from array import array
+
+from pnhp_tools import geometry
+from pnhp_tools.grouping import UnionFind
+
+
+class FlowlineNetwork(object):
+    """Undirected graph of flowline edges in compressed sparse row form. Node n's
+    neighbours are indices[indptr[n]:indptr[n+1]] and the edge used to reach each
+    of them is at the same position in adj_edge. Edge e runs from edge_from[e] to
+    edge_to[e] (the first and last vertex of the flowline) and is edge_length[e]
+    long. edge_key[e] is the id of the flowline the edge was built from, and its
+    vertices are vertex_x/vertex_y[vertex_ptr[e]:vertex_ptr[e+1]] with NaN
+    separating the parts of a multipart flowline. The arrays can be Python arrays
+    or NumPy arrays (see pnhp_tools.cache); the adjacency arrays are built from
+    the edges unless they are passed in."""
+
+    def __init__(self, node_x, node_y, edge_from, edge_to, edge_length, edge_key, vertex_ptr, vertex_x, vertex_y,
+                 indptr=None, indices=None, adj_edge=None):
+        self.node_x = node_x
+        self.node_y = node_y
+        self.edge_from = edge_from
+        self.edge_to = edge_to
+        self.edge_length = edge_length
+        self.edge_key = edge_key
+        self.vertex_ptr = vertex_ptr
+        self.vertex_x = vertex_x
+        self.vertex_y = vertex_y
+        self.edge_lookup = {int(key): e for e, key in enumerate(edge_key)}
+        if indptr is not None:
+            self.indptr = indptr
+            self.indices = indices
+            self.adj_edge = adj_edge
+            return
+
+        # count the edges at each node, then fill the adjacency arrays in one pass
+        degree = [0] * (len(node_x) + 1)
+        for u, v in zip(edge_from, edge_to):
+            degree[u + 1] += 1
+            degree[v + 1] += 1
+        for n in range(len(node_x)):
+            degree[n + 1] += degree[n]
+        self.indptr = array("l", degree)
+        self.indices = array("l", [0]) * degree[-1]
+        self.adj_edge = array("l", [0]) * degree[-1]
+        fill = list(degree[:-1])
+        for e, (u, v) in enumerate(zip(edge_from, edge_to)):
+            self.indices[fill[u]] = v
+            self.adj_edge[fill[u]] = e
+            fill[u] += 1
+            self.indices[fill[v]] = u
+            self.adj_edge[fill[v]] = e
+            fill[v] += 1
+
+    @property
+    def node_count(self):
+        return len(self.node_x)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_length)
+
+    def edge_shape(self, edge):
+        """Returns the flowline of an edge as a line Shape."""
+        parts = [[]]
+        for i in range(self.vertex_ptr[edge], self.vertex_ptr[edge + 1]):
+            x = self.vertex_x[i]
+            if math.isnan(x):
+                parts.append([])
+            else:
+                parts[-1].append((x, self.vertex_y[i]))
+        return geometry.Shape("line", parts)
+
+
+def build_network(flowlines, tolerance=0.001):
+    """Builds a FlowlineNetwork from an iterable of (key, parts) tuples, one per
+    flowline, where parts is a list of vertex lists as in Shape.parts. Edge
+    lengths are the planar lengths of the parts, so the coordinates should be
+    in meters (see geometry.from_arcpy()). Flowline ends closer than
+    tolerance are joined into the same node. Edges are numbered in the order the
+    flowlines are given."""
+    nodes = {}
+    node_x = array("d")
+    node_y = array("d")
+    edge_from = array("l")
+    edge_to = array("l")
+    edge_length = array("d")
+    edge_key = []
+    vertex_ptr = array("l", [0])
+    vertex_x = array("d")
+    vertex_y = array("d")
+
+    def node(xy):
+        k = (int(round(xy[0] / tolerance)), int(round(xy[1] / tolerance)))
+        if k not in nodes:
+            nodes[k] = len(node_x)
+            node_x.append(xy[0])
+            node_y.append(xy[1])
+        return nodes[k]
+
+    for key, parts in flowlines:
+        parts = [part for part in parts if part]
+        if not parts:
+            continue
+        length = 0.0
+        for n, part in enumerate(parts):
+            if n:
+                vertex_x.append(float("nan"))
+                vertex_y.append(float("nan"))
+            for i, (x, y) in enumerate(part):
+                vertex_x.append(x)
+                vertex_y.append(y)
+                if i:
+                    length += math.hypot(x - part[i - 1][0], y - part[i - 1][1])
+        vertex_ptr.append(len(vertex_x))
+        edge_from.append(node(parts[0][0]))
+        edge_to.append(node(parts[-1][-1]))
+        edge_length.append(length)
+        edge_key.append(key)
+    return FlowlineNetwork(node_x, node_y, edge_from, edge_to, edge_length, edge_key, vertex_ptr, vertex_x, vertex_y)
+
+
+def cut_edges(barriers):
+    """Returns a dictionary of edge: sorted list of measures where barriers (such as
+    dams) cut the edge. barriers is a list of (edge, measure) positions, e.g. dam
+    points snapped to the flowlines."""
+    cuts = {}
+    for edge, measure in barriers:
+        cuts.setdefault(edge, []).append(measure)
+    for measures in cuts.values():
+        measures.sort()
+    return cuts
+
+
+def _open(cuts, edge, low, high):
+    # true if nothing cuts the edge between the two measures; a barrier exactly at
+    # an end does not cut off the stretch, so observations can reach up to a dam
+    measures = cuts.get(edge) if cuts else None
+    if not measures:
+        return True
+    if low > high:
+        low, high = high, low
+    i = bisect.bisect_right(measures, low)
+    return i == len(measures) or measures[i] >= high
+
+
+def representative_snaps(snaps, eo_edges=()):
+    """Thins the snaps of one species down to the ones that can decide a grouping.
+    Other observations can only reach a flowline that no other observation or EO
+    rep touches through its two ends, and the first snap met from either end is
+    the nearest one (a dam that blocks it blocks everything beyond it too), so
+    only the lowest and highest measure snap of each observation on such an edge
+    are kept. Every snap is kept on edges shared with another observation or with
+    an EO rep in eo_edges, so network_components() and reached_eos() give the
+    same results as with all of the snaps."""
+    keys = {}
+    for key, edge, measure in snaps:
+        keys.setdefault(edge, set()).add(key)
+    shared = {edge for edge, found in keys.items() if len(found) > 1}
+    shared.update(e[1] for e in eo_edges)
+    ends = {}
+    kept = []
+    for snap in snaps:
+        key, edge, measure = snap
+        if edge in shared:
+            kept.append(snap)
+            continue
+        low, high = ends.get((key, edge), (snap, snap))
+        ends[(key, edge)] = (min(low, snap, key=lambda s: s[2]), max(high, snap, key=lambda s: s[2]))
+    for low, high in ends.values():
+        kept.append(low)
+        if high is not low:
+            kept.append(high)
+    return kept
+
+
+def bounded_dijkstra(network, sources, bound, cuts=None):
+    """Multi-source Dijkstra search out to bound along the network. sources is a list
+    of (label, edge, measure) positions on edges; each source starts both ends of
+    its edge unless a barrier lies in between. cuts is a dictionary from
+    cut_edges(); edges with a barrier on them are never travelled end to end.
+    Returns a dictionary of node: (distance, label) giving the nearest source of
+    each node reached."""
+    edge_from = network.edge_from
+    edge_to = network.edge_to
+    edge_length = network.edge_length
+    indptr = network.indptr
+    indices = network.indices
+    adj_edge = network.adj_edge
+    cuts = cuts or {}
+
+    heap = []
+    for label, edge, measure in sources:
+        if measure <= bound and _open(cuts, edge, 0.0, measure):
+            heap.append((measure, edge_from[edge], label))
+        if edge_length[edge] - measure <= bound and _open(cuts, edge, measure, edge_length[edge]):
+            heap.append((edge_length[edge] - measure, edge_to[edge], label))
+    heapq.heapify(heap)
+
+    best = {}
+    while heap:
+        d, node, label = heapq.heappop(heap)
+        if node in best:
+            continue
+        best[node] = (d, label)
+        for i in range(indptr[node], indptr[node + 1]):
+            e = adj_edge[i]
+            nb = indices[i]
+            if nb in best or e in cuts:
+                continue
+            nd = d + edge_length[e]
+            if nd <= bound:
+                heapq.heappush(heap, (nd, nb, label))
+    return best
+
+
+def network_components(network, snaps, separation, cuts=None):
+    """Groups snapped observations whose network distance is no more than the
+    separation distance, which is when their half separation distance service areas
+    meet. snaps is a list of (key, edge, measure); a key may have several snaps
+    (e.g. the vertices of a line) and all of them belong to the same observation.
+    cuts is a dictionary from cut_edges() of barriers that paths may not cross.
+
+    A search to half the separation distance labels every node with its nearest
+    observation. Any path of no more than the separation distance between two
+    observations then passes only through labelled nodes, so checking the places
+    where neighbouring labels meet (whole edges between labelled nodes, the
+    stretches between a snap and the ends of its edge, and snaps next to each other
+    on one edge) finds every link. Returns UnionFind.components() of the keys."""
+    cuts = cuts or {}
+    half = separation / 2.0
+    best = bounded_dijkstra(network, snaps, half, cuts)
+    uf = UnionFind(s[0] for s in snaps)
+    edge_length = network.edge_length
+
+    by_edge = {}
+    for key, edge, measure in snaps:
+        by_edge.setdefault(edge, []).append((measure, key))
+    for edge, positions in by_edge.items():
+        positions.sort()
+        # observations next to each other on the same edge
+        for (m1, k1), (m2, k2) in zip(positions, positions[1:]):
+            if k1 != k2 and m2 - m1 <= separation and _open(cuts, edge, m1, m2):
+                uf.union(k1, k2)
+        # from each observation to the nearest observation of the nodes at either end of its edge
+        ends = ((network.edge_from[edge], 0.0), (network.edge_to[edge], edge_length[edge]))
+        for measure, key in positions:
+            for node, end in ends:
+                d = abs(end - measure)
+                if node in best and best[node][1] != key and d + best[node][0] <= separation and _open(cuts, edge, measure, end):
+                    uf.union(key, best[node][1])
+
+    # whole edges whose two ends were reached from different observations
+    indptr = network.indptr
+    for node, (d, label) in best.items():
+        for i in range(indptr[node], indptr[node + 1]):
+            other = best.get(network.indices[i])
+            e = network.adj_edge[i]
+            if other and other[1] != label and e not in cuts and d + edge_length[e] + other[0] <= separation:
+                uf.union(label, other[1])
+    return uf.components()
+
+
+def reached_eos(network, snaps, eo_edges, distance, cuts=None):
+    """Returns the EO IDs reached within distance along the network from any of the
+    snaps. eo_edges is a list of (eo_id, edge, low, high) giving the stretch of an
+    edge that an EO rep touches (see SnapIndex.stretches). cuts is a dictionary from
+    cut_edges(); an EO rep on the far side of a barrier is not reached."""
+    cuts = cuts or {}
+    best = bounded_dijkstra(network, snaps, distance, cuts)
+    on_edge = {}
+    for key, edge, measure in snaps:
+        on_edge.setdefault(edge, []).append(measure)
+    found = set()
+    for eo_id, edge, low, high in eo_edges:
+        if eo_id in found:
+            continue
+        length = network.edge_length[edge]
+        u = best.get(network.edge_from[edge])
+        v = best.get(network.edge_to[edge])
+        if u and u[0] + low <= distance and _open(cuts, edge, 0.0, low):
+            found.add(eo_id)
+        elif v and v[0] + length - high <= distance and _open(cuts, edge, high, length):
+            found.add(eo_id)
+        elif any(max(low - m, m - high, 0.0) <= distance and _open(cuts, edge, m, min(max(m, low), high))
+                 for m in on_edge.get(edge, ())):
+            found.add(eo_id)
+    return found
+
+
+# network used by species_network_groups; set in each worker process by set_network
+_network = None
+
+
+def set_network(network):
+    """Makes network available to species_network_groups. Used as the process pool
+    initializer so the network is sent to each worker once rather than per task.
+    network may also be the folder of a cached network, which each worker then
+    opens from disk instead of receiving a copy. set_network(None) lets go of it,
+    which closes the memory-mapped files of a cached network opened in this
+    process."""
+    global _network
+    if isinstance(network, str):
+        from pnhp_tools import cache
+        network = cache.load_network(network)
+    _network = network
+
+
+def species_network_groups(task):
+    """Groups the snapped observations of one species along the network and looks up
+    the existing EO reps reached from each group. task is (snaps, separation,
+    eo_edges, cuts) with separation in meters. Returns a list of (members, eoid)
+    where eoid is "" if no EO rep is within separation distance of the group."""
+    snaps, separation, eo_edges, cuts = task
+    snaps = representative_snaps(snaps, eo_edges)
+    by_key = {}
+    for snap in snaps:
+        by_key.setdefault(snap[0], []).append(snap)
+    groups = []
+    for members in network_components(_network, snaps, separation, cuts):
+        found = reached_eos(_network, [s for key in members for s in by_key[key]], eo_edges, separation, cuts)
+        groups.append((members, ",".join(sorted({str(int(eo_id)) for eo_id in found}))))
+    return groups
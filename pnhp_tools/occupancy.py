@@ -0,0 +1,222 @@
+#-------------------------------------------------------------------------------
+# Name:         occupancy.py
+# Purpose:      Area of occupancy by grid cell hashing. Observations are reduced to
+#               the integer indices of the square grid cells they touch (points
+#               directly, lines and polygons by rasterizing their coverage) and the
+#               distinct (species, cell) pairs are counted with NumPy, so no grid
+#               feature class or select by location is needed.
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import numpy as np
+
+
+def expand(counts):
+    """Returns the row number and the position within its row of every item when
+    row i has counts[i] items, as two arrays. Used to turn per-row ranges into
+    flat arrays without a Python loop."""
+    counts = np.asarray(counts, dtype=np.int64)
+    rows = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return rows, offsets
+
+
+def _crossings(a0, a1):
+    # grid lines strictly past the start of each segment along one axis, up to and including its end
+    low = np.floor(np.minimum(a0, a1))
+    count = (np.floor(np.maximum(a0, a1)) - low).astype(np.int64)
+    seg, offset = expand(count)
+    lines = low[seg] + 1.0 + offset
+    span = (a1 - a0)[seg]
+    return seg, (lines - a0[seg]) / np.where(span != 0.0, span, 1.0)
+
+
+class Coverage(object):
+    """Geometry of a list of observations held as flat coordinate arrays for grid
+    cell rasterization. Points are held as coordinates, lines and polygon rings as
+    segments and polygon rings again as edges for filling their interiors. Each
+    array has an owner array with the number of the observation it came from."""
+
+    def __init__(self, count, points, segments, edges):
+        self.count = count
+        self.point_owner, self.px, self.py = points
+        self.segment_owner, self.segments = segments
+        self.edge_owner, self.edges = edges
+
+    @classmethod
+    def from_points(cls, xy):
+        """Builds a Coverage from a list of (x, y) point coordinates."""
+        xy = np.array(xy, dtype=np.float64).reshape(-1, 2)
+        empty = (np.zeros(0, dtype=np.int64), np.zeros((0, 4), dtype=np.float64))
+        return cls(len(xy), (np.arange(len(xy)), xy[:, 0].copy(), xy[:, 1].copy()), empty, empty)
+
+    @classmethod
+    def from_shapes(cls, shapes):
+        """Builds a Coverage from a list of geometry.Shape objects."""
+        points = ([], [])
+        segments = ([], [])
+        edges = ([], [])
+        for i, shape in enumerate(shapes):
+            for part in shape.parts:
+                if shape.kind == "point" or len(part) == 1:
+                    points[0].append(i)
+                    points[1].append(part[0])
+                    continue
+                vertices = part
+                if shape.kind == "polygon" and part[0] != part[-1]:
+                    vertices = part + part[:1]
+                pairs = [vertices[j] + vertices[j + 1] for j in range(len(vertices) - 1)]
+                segments[0].extend([i] * len(pairs))
+                segments[1].extend(pairs)
+                if shape.kind == "polygon":
+                    edges[0].extend([i] * len(pairs))
+                    edges[1].extend(pairs)
+        xy = np.array(points[1], dtype=np.float64).reshape(-1, 2)
+        return cls(len(shapes), (np.array(points[0], dtype=np.int64), xy[:, 0].copy(), xy[:, 1].copy()),
+                   (np.array(segments[0], dtype=np.int64), np.array(segments[1], dtype=np.float64).reshape(-1, 4)),
+                   (np.array(edges[0], dtype=np.int64), np.array(edges[1], dtype=np.float64).reshape(-1, 4)))
+
+    def origin(self):
+        """Returns the lower left corner (xmin, ymin) of all of the coordinates."""
+        owner, x, y = self.vertices()
+        if not len(x):
+            return 0.0, 0.0
+        return float(x.min()), float(y.min())
+
+    def vertices(self):
+        """Returns every vertex as three arrays: observation number, x and y. Vertices
+        shared by two segments are listed twice."""
+        return (np.concatenate([self.point_owner, self.segment_owner, self.segment_owner]),
+                np.concatenate([self.px, self.segments[:, 0], self.segments[:, 2]]),
+                np.concatenate([self.py, self.segments[:, 1], self.segments[:, 3]]))
+
+    def _segment_cells(self, size, origin):
+        # every cell a segment passes through: split each segment where it crosses a
+        # grid line and take the cell of the middle of every piece
+        if not len(self.segments):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        u0 = (self.segments[:, 0] - origin[0]) / size
+        v0 = (self.segments[:, 1] - origin[1]) / size
+        u1 = (self.segments[:, 2] - origin[0]) / size
+        v1 = (self.segments[:, 3] - origin[1]) / size
+        n = len(self.segments)
+        xseg, xt = _crossings(u0, u1)
+        yseg, yt = _crossings(v0, v1)
+        seg = np.concatenate([np.arange(n), np.arange(n), xseg, yseg])
+        t = np.concatenate([np.zeros(n), np.ones(n), xt, yt])
+        # t is between 0 and 1, so one float key sorts by segment and then along it
+        order = np.argsort(seg * 2.0 + t)
+        seg = seg[order]
+        t = t[order]
+        same = seg[1:] == seg[:-1]
+        piece = seg[1:][same]
+        middle = (t[1:][same] + t[:-1][same]) / 2.0
+        col = np.floor(u0[piece] + middle * (u1 - u0)[piece]).astype(np.int64)
+        row = np.floor(v0[piece] + middle * (v1 - v0)[piece]).astype(np.int64)
+        return self.segment_owner[piece], col, row
+
+    def _interior_cells(self, size, origin):
+        # cells whose center is inside a polygon, by scanlines through the cell centers;
+        # a ring edge crosses the scanline of row r if it spans r + 0.5 (half open, so
+        # shared vertices are counted once) and each row of each polygon is filled
+        # between pairs of crossings by the even-odd rule
+        if not len(self.edges):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        u0 = (self.edges[:, 0] - origin[0]) / size
+        v0 = (self.edges[:, 1] - origin[1]) / size
+        u1 = (self.edges[:, 2] - origin[0]) / size
+        v1 = (self.edges[:, 3] - origin[1]) / size
+        first = np.ceil(np.minimum(v0, v1) - 0.5).astype(np.int64)
+        count = np.ceil(np.maximum(v0, v1) - 0.5).astype(np.int64) - first
+        edge, offset = expand(count)
+        row = first[edge] + offset
+        u = u0[edge] + (row + 0.5 - v0[edge]) * (u1 - u0)[edge] / (v1 - v0)[edge]
+        owner = self.edge_owner[edge]
+        order = np.lexsort((u, row, owner))
+        owner = owner[order][0::2]
+        row = row[order][0::2]
+        u = u[order]
+        start = np.ceil(u[0::2] - 0.5).astype(np.int64)
+        span = np.ceil(u[1::2] - 0.5).astype(np.int64) - start
+        run, offset = expand(np.maximum(span, 0))
+        return owner[run], start[run] + offset, row[run]
+
+    def cells(self, size, origin=None):
+        """Returns the cells of a square grid of the given cell size touched by each
+        observation as three arrays: observation number, column and row. Cell (0, 0)
+        has its lower left corner at origin (the lower left corner of the
+        coordinates if None). A cell may be listed more than once."""
+        if origin is None:
+            origin = self.origin()
+        owner = [self.point_owner]
+        col = [np.floor((self.px - origin[0]) / size).astype(np.int64)]
+        row = [np.floor((self.py - origin[1]) / size).astype(np.int64)]
+        for o, c, r in (self._segment_cells(size, origin), self._interior_cells(size, origin)):
+            owner.append(o)
+            col.append(c)
+            row.append(r)
+        return np.concatenate(owner), np.concatenate(col), np.concatenate(row)
+
+
+def _count_distinct(groups, count, col, row):
+    # number of distinct (group, column, row) triples of each group
+    counts = np.zeros(count, dtype=np.int64)
+    if not len(groups):
+        return counts
+    col = col - col.min()
+    row = row - row.min()
+    width = int(col.max()) + 1
+    height = int(row.max()) + 1
+    if count * width * height < 2 ** 62:
+        # pack each triple into one integer so a single sort finds the distinct ones
+        key = np.sort((groups * height + row) * width + col)
+        new = np.ones(len(key), dtype=bool)
+        new[1:] = key[1:] != key[:-1]
+        return counts + np.bincount(key[new] // (width * height), minlength=count)
+    order = np.lexsort((row, col, groups))
+    groups = groups[order]
+    col = col[order]
+    row = row[order]
+    new = np.ones(len(groups), dtype=bool)
+    new[1:] = (groups[1:] != groups[:-1]) | (col[1:] != col[:-1]) | (row[1:] != row[:-1])
+    return counts + np.bincount(groups[new], minlength=count)
+
+
+def occupied_cells_by_size(groups, coverage, sizes, origin=None, count=None):
+    """Returns the number of distinct grid cells touched by the observations of
+    each group for each of several cell sizes, as a dictionary of size: array
+    indexed by group number. The coordinates are rasterized once at the smallest
+    size; a larger size that is a whole multiple of a smaller one has its cells
+    found by dividing the smaller cell indices, since a geometry touches a cell
+    exactly when it touches one of the smaller cells that tile it. Other sizes are
+    rasterized from the same coordinate arrays. count is the number of groups (one
+    more than the largest group number if None)."""
+    groups = np.asarray(groups, dtype=np.int64)
+    if count is None:
+        count = int(groups.max()) + 1 if len(groups) else 0
+    if origin is None:
+        origin = coverage.origin()
+    results = {}
+    rasterized = []
+    for size in sorted(set(sizes)):
+        for base, (owner, col, row) in rasterized:
+            factor = size / base
+            if abs(factor - round(factor)) < 1e-9:
+                factor = int(round(factor))
+                cells = (owner, col // factor, row // factor)
+                break
+        else:
+            cells = coverage.cells(size, origin)
+            rasterized.append((size, cells))
+        results[size] = _count_distinct(groups[cells[0]], count, cells[1], cells[2])
+    return results
+
+
+def occupied_cells(groups, coverage, size, origin=None):
+    """Returns the number of distinct grid cells of the given size touched by the
+    observations of each group, as an array indexed by group number. groups holds
+    the group number (usually the species) of each observation in coverage. All
+    groups are counted in one pass by sorting the (group, column, row) triples and
+    counting the ones that differ from their neighbor."""
+    return occupied_cells_by_size(groups, coverage, [size], origin)[size]
@@ -0,0 +1,65 @@
+#-------------------------------------------------------------------------------
+# Name:         parallel.py
+# Purpose:      Partition-by-species scheduling for the grouping engines. Species
+#               never group across each other, so each species' records can be
+#               handed to a separate worker process and the results merged back in
+#               a fixed species order.
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import multiprocessing
+import os
+import sys
+
+
+def partition_by_species(records, position=1):
+    """Splits a list of tuples into per-species lists using the species value at
+    the given position. Returns a list of (species, records) sorted by species so
+    that merged results are always in the same order."""
+    groups = {}
+    for record in records:
+        groups.setdefault(record[position], []).append(record)
+    return sorted(groups.items(), key=lambda item: str(item[0]))
+
+
+def _worker_executable():
+    # ArcGIS Pro runs tools inside ArcGISPro.exe, which cannot be used to start worker
+    # processes, so point multiprocessing at the python executable of the active environment
+    if os.path.basename(sys.executable).lower().startswith("python"):
+        return sys.executable
+    if os.name == "nt":
+        return os.path.join(sys.exec_prefix, "python.exe")
+    return os.path.join(sys.exec_prefix, "bin", "python")
+
+
+def _run_indexed(args):
+    func, n, task = args
+    return n, func(task)
+
+
+def map_tasks(func, tasks, processes=1, sizes=None, initializer=None, initargs=()):
+    """Runs func on each task and returns the results in task order. func must be a
+    module level function so it can be sent to worker processes. When processes is
+    greater than 1 the tasks run in a process pool, largest first (by sizes, if
+    given) so one big species does not hold up the end of the run. initializer is
+    called with initargs once in each worker (or once in this process when running
+    in serial) to hand over data shared by every task, such as a network."""
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(int(processes), len(tasks))
+    if processes <= 1:
+        if initializer:
+            initializer(*initargs)
+        return [func(task) for task in tasks]
+
+    order = list(range(len(tasks)))
+    if sizes:
+        order.sort(key=lambda n: -sizes[n])
+    context = multiprocessing.get_context("spawn")
+    context.set_executable(_worker_executable())
+    results = [None] * len(tasks)
+    with context.Pool(processes, initializer, initargs) as pool:
+        for n, result in pool.imap_unordered(_run_indexed, [(func, n, tasks[n]) for n in order]):
+            results[n] = result
+    return results
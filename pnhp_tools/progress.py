@@ -0,0 +1,127 @@
+#-------------------------------------------------------------------------------
+# Name:         progress.py
+# Purpose:      Rate-limited progress messages and phase timings for long running
+#               tool loops. Messages go through a callback (usually
+#               arcpy.AddMessage) no more often than the set interval, and every
+#               event can also be written to a JSON-lines trace file for later
+#               analysis.
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import json
+import os
+import time
+
+# a trace file is written when this environment variable holds its path
+TRACE_VARIABLE = "PNHP_TRACE"
+
+
+def _duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return str(seconds) + " s"
+    if seconds < 3600:
+        return "{}:{:02d} min".format(seconds // 60, seconds % 60)
+    return "{}:{:02d}:{:02d} h".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class Progress(object):
+    """Reports the progress of a tool as a series of phases. start() begins a
+    phase, step() counts records in it and sends a message with the count, the
+    rate in records per second and the estimated time left at most once every
+    interval seconds, and finish() reports the phase's total time. close() reports
+    the time of every phase and closes the trace file. Used as a context manager
+    (with Progress(...) as reporter:), close() is called even when the tool
+    raises, so the trace file is not left open and its last events are kept.
+
+    message is the function messages are sent to. trace is the path of a
+    JSON-lines file to append events to; when it is None the path is taken from
+    the PNHP_TRACE environment variable, and no file is written if that is not
+    set either."""
+
+    def __init__(self, message=print, interval=5.0, trace=None, tool=None):
+        self.message = message
+        self.interval = float(interval)
+        self.tool = tool
+        self.phases = []
+        self.phase = None
+        self.total = None
+        self.unit = "records"
+        self.count = 0
+        self._began = time.time()
+        self._start = None
+        self._next = None
+        trace = trace or os.environ.get(TRACE_VARIABLE)
+        self._trace = open(trace, "a") if trace else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write(self, event, **values):
+        if self._trace:
+            record = {"time": round(time.time(), 3), "tool": self.tool, "event": event, "phase": self.phase}
+            record.update(values)
+            self._trace.write(json.dumps(record) + "\n")
+
+    def start(self, phase, total=None, unit="records"):
+        """Begins a new phase (finishing the current one, if any). total is the
+        number of records the phase will count, if it is known, and is used for
+        the estimated time left. unit is the word used for what is counted."""
+        if self.phase is not None:
+            self.finish()
+        self.phase = phase
+        self.total = total
+        self.unit = unit
+        self.count = 0
+        self._start = time.time()
+        self._next = self._start + self.interval
+        self._write("start", total=total)
+
+    def step(self, count=1):
+        """Counts records in the current phase. Cheap enough to call once per
+        record; a message is only sent when the interval has passed."""
+        self.count += count
+        now = time.time()
+        if now < self._next:
+            return
+        self._next = now + self.interval
+        elapsed = now - self._start
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        text = self.phase + ": " + str(self.count)
+        if self.total:
+            text += "/" + str(self.total)
+        text += " " + self.unit + " ({:.0f}/s".format(rate)
+        if self.total and rate > 0:
+            text += ", about " + _duration((self.total - self.count) / rate) + " left"
+        self.message(text + ").")
+        self._write("progress", count=self.count, total=self.total, elapsed=round(elapsed, 3), rate=round(rate, 3))
+
+    def finish(self):
+        """Ends the current phase and reports how long it took."""
+        if self.phase is None:
+            return
+        elapsed = time.time() - self._start
+        self.phases.append((self.phase, elapsed, self.count))
+        text = self.phase + " took " + _duration(elapsed)
+        if self.count:
+            text += " ({} {}, {:.0f}/s)".format(self.count, self.unit, self.count / elapsed if elapsed > 0 else 0.0)
+        self.message(text + ".")
+        self._write("finish", count=self.count, elapsed=round(elapsed, 3))
+        self.phase = None
+
+    def close(self):
+        """Finishes the current phase, reports the time taken by each phase and
+        closes the trace file."""
+        self.finish()
+        elapsed = time.time() - self._began
+        if len(self.phases) > 1:
+            self.message("Timings: " + "; ".join(name + " " + _duration(seconds) for name, seconds, count in self.phases) +
+                         "; total " + _duration(elapsed) + ".")
+        self._write("close", elapsed=round(elapsed, 3), phases=[{"phase": p[0], "elapsed": round(p[1], 3), "count": p[2]} for p in self.phases])
+        if self._trace:
+            self._trace.close()
+            self._trace = None
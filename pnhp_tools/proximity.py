@@ -0,0 +1,129 @@
+#-------------------------------------------------------------------------------
+# Name:         proximity.py
+# Purpose:      Exact minimum distance between observations and reference features
+#               (EO reps, source features) using NumPy. Features are filtered by
+#               their extents and the remaining segment pairs are measured all at
+#               once, so no buffered copies of the reference layers are needed.
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import numpy as np
+
+from pnhp_tools import geometry
+
+
+def segment_array(shape):
+    """Returns the segments of a Shape as an (n, 4) array of x0, y0, x1, y1. Points
+    and single vertex parts become zero length segments."""
+    segments = []
+    for part in shape.parts:
+        if len(part) == 1:
+            segments.append(part[0] + part[0])
+        else:
+            segments.extend(part[i] + part[i + 1] for i in range(len(part) - 1))
+    return np.array(segments, dtype=np.float64).reshape(-1, 4)
+
+
+def _point_segment(px, py, x0, y0, x1, y1):
+    dx = x1 - x0
+    dy = y1 - y0
+    length2 = dx * dx + dy * dy
+    t = ((px - x0) * dx + (py - y0) * dy) / np.where(length2 > 0.0, length2, 1.0)
+    t = np.clip(np.where(length2 > 0.0, t, 0.0), 0.0, 1.0)
+    return np.hypot(px - (x0 + t * dx), py - (y0 + t * dy))
+
+
+def _cross(ox, oy, ax, ay, bx, by):
+    return (ax - ox) * (by - oy) - (ay - oy) * (bx - ox)
+
+
+def segment_distance(a, b):
+    """Returns the minimum distance between any segment in a and any segment in b,
+    both (n, 4) arrays from segment_array(). Segments that properly cross are
+    zero distance apart, as in geometry.distance()."""
+    ax0, ay0, ax1, ay1 = (a[:, i:i + 1] for i in range(4))
+    bx0, by0, bx1, by1 = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    d = np.minimum(np.minimum(_point_segment(ax0, ay0, bx0, by0, bx1, by1), _point_segment(ax1, ay1, bx0, by0, bx1, by1)),
+                   np.minimum(_point_segment(bx0, by0, ax0, ay0, ax1, ay1), _point_segment(bx1, by1, ax0, ay0, ax1, ay1)))
+    d1 = _cross(bx0, by0, bx1, by1, ax0, ay0)
+    d2 = _cross(bx0, by0, bx1, by1, ax1, ay1)
+    d3 = _cross(ax0, ay0, ax1, ay1, bx0, by0)
+    d4 = _cross(ax0, ay0, ax1, ay1, bx1, by1)
+    d[(d1 * d2 < 0.0) & (d3 * d4 < 0.0)] = 0.0
+    return float(d.min())
+
+
+def pair_distance(a, b):
+    """Returns the distance between segment a[i] and segment b[i] for every row of
+    two (n, 4) segment arrays of the same length. Crossing segments are zero
+    distance apart, as in segment_distance()."""
+    ax0, ay0, ax1, ay1 = a[:, 0], a[:, 1], a[:, 2], a[:, 3]
+    bx0, by0, bx1, by1 = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    d = np.minimum(np.minimum(_point_segment(ax0, ay0, bx0, by0, bx1, by1), _point_segment(ax1, ay1, bx0, by0, bx1, by1)),
+                   np.minimum(_point_segment(bx0, by0, ax0, ay0, ax1, ay1), _point_segment(bx1, by1, ax0, ay0, ax1, ay1)))
+    crossing = ((_cross(bx0, by0, bx1, by1, ax0, ay0) * _cross(bx0, by0, bx1, by1, ax1, ay1) < 0.0) &
+                (_cross(ax0, ay0, ax1, ay1, bx0, by0) * _cross(ax0, ay0, ax1, ay1, bx1, by1) < 0.0))
+    d[crossing] = 0.0
+    return d
+
+
+def segments_within(a, b, radius):
+    """Returns True if any segment of a is within radius of any segment of b. Large
+    segment sets are compared in blocks so memory stays bounded and the test can
+    stop at the first block that is close enough."""
+    step = max(1, 500000 // max(len(b), 1))
+    for i in range(0, len(a), step):
+        if segment_distance(a[i:i + step], b) <= radius:
+            return True
+    return False
+
+
+def _inside(a, b):
+    # true if any part of b starts inside polygon a; partial overlaps are caught by the segment test
+    return a.kind == "polygon" and any(geometry.contains_point(a, part[0]) for part in b.parts)
+
+
+class FeatureIndex(object):
+    """Reference features of each species with their extents held in a NumPy array
+    for prefiltering and their segments held as arrays for the distance test.
+    Has the same insert/query interface as grouping.GridIndex."""
+
+    def __init__(self):
+        self.shapes = {}
+        self.segments = {}
+        self._keys = {}
+        self._extents = {}
+
+    def insert(self, key, species, shape):
+        """Adds a shape to the index under the given key and species."""
+        self.shapes[key] = shape
+        self.segments[key] = segment_array(shape)
+        self._keys.setdefault(species, []).append(key)
+        self._extents.pop(species, None)
+
+    def candidates(self, species, extent, radius):
+        """Returns the keys of the shapes of species whose extent is within radius
+        of the given extent, in the order they were inserted."""
+        keys = self._keys.get(species)
+        if not keys:
+            return []
+        if species not in self._extents:
+            self._extents[species] = np.array([self.shapes[key].extent for key in keys], dtype=np.float64)
+        e = self._extents[species]
+        dx = np.maximum(np.maximum(e[:, 0] - extent[2], extent[0] - e[:, 2]), 0.0)
+        dy = np.maximum(np.maximum(e[:, 1] - extent[3], extent[1] - e[:, 3]), 0.0)
+        return [keys[i] for i in np.flatnonzero(np.hypot(dx, dy) <= radius)]
+
+    def query(self, species, shape, radius):
+        """Returns the keys of all indexed shapes of species within radius of shape."""
+        found = set()
+        candidates = self.candidates(species, shape.extent, radius)
+        if not candidates:
+            return found
+        segments = segment_array(shape)
+        for key in candidates:
+            other = self.shapes[key]
+            if _inside(other, shape) or _inside(shape, other) or segments_within(segments, self.segments[key], radius):
+                found.add(key)
+        return found
@@ -0,0 +1,86 @@
+#-------------------------------------------------------------------------------
+# Name:         rankstats.py
+# Purpose:      Rank calculator stats (number of observations and occurrences,
+#               range extent and area of occupancy) as one columnar result with a
+#               record per species. The result is a NumPy structured array that the
+#               Rank Calculator Stats tool writes in a single insert and that
+#               scripts can use directly or as a pandas DataFrame without ArcGIS.
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import numpy as np
+
+from pnhp_tools import extent, occupancy
+
+# metrics every table has, in output order; area of occupancy columns follow
+FIELDS = ("obs_num", "occurrence_num", "range_extent_km2")
+
+
+def occupancy_areas(groups, coverage, sizes, origin=None, count=None, meters=1.0):
+    """Returns the area of occupancy in km2 of each group for each grid cell size
+    in meters, as a dictionary of size: array indexed by group number. meters is
+    the length of one coordinate unit in meters."""
+    counts = occupancy.occupied_cells_by_size(groups, coverage, [size / meters for size in sizes], origin, count)
+    return {size: counts[size / meters] * (size * size / 1000000.0) for size in sizes}
+
+
+def hull_areas(groups, coverage, count=None, meters=1.0):
+    """Returns the planar area in km2 of the convex hull of the observations of each
+    group as an array indexed by group number, NaN for groups whose hull has no
+    area. The Rank Calculator Stats tool measures hulls geodesically with arcpy
+    instead; this is for use without it."""
+    hulls = extent.coverage_hulls(groups, coverage)
+    if count is None:
+        count = max(hulls) + 1 if hulls else 0
+    areas = np.full(count, np.nan)
+    for group, hull in hulls.items():
+        if len(hull) > 2:
+            x = np.array([p[0] for p in hull])
+            y = np.array([p[1] for p in hull])
+            areas[group] = abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2.0 * meters * meters / 1000000.0
+    return areas
+
+
+def stats_table(species, rows, occupancy_fields):
+    """Returns the stats as a NumPy structured array with a species field, the
+    FIELDS and the given area of occupancy fields. species is the list of species
+    and rows holds the values of each species in field order; a range extent of
+    None becomes NaN."""
+    dtype = [("species", object), ("obs_num", np.int64), ("occurrence_num", np.int64), ("range_extent_km2", np.float64)]
+    dtype += [(name, np.float64) for name in occupancy_fields]
+    table = np.zeros(len(species), dtype=dtype)
+    table["species"] = species
+    for j, (name, kind) in enumerate(dtype[1:]):
+        column = [row[j] for row in rows]
+        table[name] = [np.nan if value is None else value for value in column] if kind is np.float64 else column
+    return table
+
+
+def compute(species, groups, coverage, obs_num, occurrence_num, sizes, occupancy_fields, origin=None, meters=1.0):
+    """Calculates the stats of every species without ArcGIS and returns them as a
+    stats_table(). species is the list of species codes, groups holds the index
+    in species of each observation in coverage, obs_num and occurrence_num the
+    counts of each species, and sizes the grid cell sizes in meters that go with
+    occupancy_fields. Range extent is the planar convex hull area."""
+    count = len(species)
+    ranges = hull_areas(groups, coverage, count, meters)
+    areas = occupancy_areas(groups, coverage, sizes, origin, count, meters)
+    rows = [[obs_num[i], occurrence_num[i], float(ranges[i])] + [float(areas[size][i]) for size in sizes] for i in range(count)]
+    return stats_table(species, rows, occupancy_fields)
+
+
+def table_rows(table):
+    """Returns the records of a stats_table() as lists ready for an InsertCursor,
+    with NaN written as None (null)."""
+    rows = []
+    for record in table.tolist():
+        rows.append([None if isinstance(value, float) and value != value else value for value in record])
+    return rows
+
+
+def to_dataframe(table):
+    """Returns a stats_table() as a pandas DataFrame. pandas is only needed when
+    this is called."""
+    import pandas
+    return pandas.DataFrame({name: table[name] for name in table.dtype.names})
@@ -0,0 +1,88 @@
+#-------------------------------------------------------------------------------
+# Name:         reference.py
+# Purpose:      In-memory index of a reference layer (EO reps or source features)
+#               from the monthly Biotics export. Geometries, ids and extents are
+#               held as flat NumPy arrays grouped by species so the layer can be
+#               cached on the local disk and queried without geoprocessing.
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import numpy as np
+
+from pnhp_tools import geometry
+
+KINDS = ("point", "line", "polygon")
+
+
+class ReferenceLayer(object):
+    """Features of a reference layer as arrays. ids and species are lists with one
+    entry per feature; kind holds the index of each feature's kind in KINDS and
+    extent its (xmin, ymin, xmax, ymax). The vertices of feature i are parts
+    part_ptr[i] to part_ptr[i + 1], and the vertices of part j are x and y from
+    vertex_ptr[j] to vertex_ptr[j + 1]."""
+
+    def __init__(self, ids, species, kind, extent, part_ptr, vertex_ptr, x, y):
+        self.ids = list(ids)
+        self.species = list(species)
+        self.kind = kind
+        self.extent = extent
+        self.part_ptr = part_ptr
+        self.vertex_ptr = vertex_ptr
+        self.x = x
+        self.y = y
+        self._rows = {}
+        for i, code in enumerate(self.species):
+            self._rows.setdefault(code, []).append(i)
+
+    @classmethod
+    def from_features(cls, features):
+        """Builds a ReferenceLayer from a list of (id, species, Shape)."""
+        kind = []
+        part_ptr = [0]
+        vertex_ptr = [0]
+        xy = []
+        for fid, code, shape in features:
+            kind.append(KINDS.index(shape.kind))
+            for part in shape.parts:
+                xy.extend(part)
+                vertex_ptr.append(len(xy))
+            part_ptr.append(len(vertex_ptr) - 1)
+        xy = np.array(xy, dtype=np.float64).reshape(-1, 2)
+        return cls([f[0] for f in features], [f[1] for f in features], np.array(kind, dtype=np.int8),
+                   np.array([f[2].extent for f in features], dtype=np.float64).reshape(-1, 4),
+                   np.array(part_ptr, dtype=np.int64), np.array(vertex_ptr, dtype=np.int64), xy[:, 0].copy(), xy[:, 1].copy())
+
+    @property
+    def feature_count(self):
+        return len(self.ids)
+
+    def shape(self, i):
+        """Returns feature i as a Shape."""
+        parts = []
+        for j in range(self.part_ptr[i], self.part_ptr[i + 1]):
+            start, end = self.vertex_ptr[j], self.vertex_ptr[j + 1]
+            parts.append(list(zip(self.x[start:end].tolist(), self.y[start:end].tolist())))
+        return geometry.Shape(KINDS[self.kind[i]], parts)
+
+    def rows(self, species_set=None):
+        """Returns the feature numbers of the given species (all species if None)
+        in layer order."""
+        if species_set is None:
+            return list(range(self.feature_count))
+        return sorted(i for code in species_set for i in self._rows.get(code, []))
+
+    def features(self, species_set=None):
+        """Returns a list of (id, species, Shape) for the features of the given
+        species (all species if None) in layer order, as the grouping functions
+        expect them."""
+        return [(self.ids[i], self.species[i], self.shape(i)) for i in self.rows(species_set)]
+
+    def species_extents(self):
+        """Returns a dictionary of species: (xmin, ymin, xmax, ymax) covering all of
+        the features of each species."""
+        extents = {}
+        for code, rows in self._rows.items():
+            e = self.extent[rows]
+            extents[code] = (float(e[:, 0].min()), float(e[:, 1].min()), float(e[:, 2].max()), float(e[:, 3].max()))
+        return extents
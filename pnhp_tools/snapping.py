@@ -0,0 +1,170 @@
+#-------------------------------------------------------------------------------
+# Name:         snapping.py
+# Purpose:      Snapping of observations to the flowline network. A grid index over
+#               every flowline segment of a FlowlineNetwork finds the nearest
+#               flowline of each observation vertex, the measure along it and the
+#               snap distance, replacing Near and measureOnLine calls per tool.
+# Author:       Pennsylvania Natural Heritage Program
+# Created:      10/18/2026
+#-------------------------------------------------------------------------------
+
+import math
+
+import numpy as np
+
+from pnhp_tools import geometry
+
+
+class SnapIndex(object):
+    """Uniform grid over the segments of the flowlines in a FlowlineNetwork. Each
+    segment is listed in every cell its extent covers, with the cells held as
+    sorted NumPy arrays so a query is a couple of searchsorted calls. cell_size
+    should be a little larger than the usual snap distance."""
+
+    def __init__(self, net, cell_size=250.0):
+        self.cell_size = float(cell_size)
+        x = np.asarray(net.vertex_x, dtype=np.float64)
+        y = np.asarray(net.vertex_y, dtype=np.float64)
+        ptr = np.asarray(net.vertex_ptr, dtype=np.int64)
+        vertex_edge = np.repeat(np.arange(len(ptr) - 1), np.diff(ptr))
+
+        # measure of each vertex along its edge; part breaks (NaN) add no length
+        step = np.nan_to_num(np.hypot(np.diff(x), np.diff(y)))
+        along = np.concatenate(([0.0], np.cumsum(step)))
+        measure = along - along[ptr[:-1]][vertex_edge]
+
+        # segment i runs from vertex i to i + 1 when both are on the same part of the same edge
+        start = np.flatnonzero((vertex_edge[:-1] == vertex_edge[1:]) & ~np.isnan(x[:-1]) & ~np.isnan(x[1:]))
+        self.x0 = x[start]
+        self.y0 = y[start]
+        self.x1 = x[start + 1]
+        self.y1 = y[start + 1]
+        self.edge = vertex_edge[start]
+        self.measure = measure[start]
+        self.length = np.hypot(self.x1 - self.x0, self.y1 - self.y0)
+
+        # list each segment in every cell its extent covers
+        size = self.cell_size
+        cx0 = np.floor(np.minimum(self.x0, self.x1) / size).astype(np.int64)
+        cy0 = np.floor(np.minimum(self.y0, self.y1) / size).astype(np.int64)
+        nx = np.floor(np.maximum(self.x0, self.x1) / size).astype(np.int64) - cx0 + 1
+        ny = np.floor(np.maximum(self.y0, self.y1) / size).astype(np.int64) - cy0 + 1
+        count = nx * ny
+        segment = np.repeat(np.arange(len(start)), count)
+        offset = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        keys = self._key(cx0[segment] + offset % nx[segment], cy0[segment] + offset // nx[segment])
+        order = np.argsort(keys, kind="stable")
+        self.cell_keys, first = np.unique(keys[order], return_index=True)
+        self.cell_start = np.append(first, len(order))
+        self.cell_segments = segment[order]
+
+    @staticmethod
+    def _key(cx, cy):
+        return cx * (1 << 32) + (cy + (1 << 31))
+
+    @property
+    def segment_count(self):
+        return len(self.edge)
+
+    def segments(self, extent, radius=0.0):
+        """Returns the ids of the segments listed in the cells within radius of
+        extent (xmin, ymin, xmax, ymax). The result can include segments that are
+        further away; callers measure the true distance."""
+        size = self.cell_size
+        cx = np.arange(math.floor((extent[0] - radius) / size), math.floor((extent[2] + radius) / size) + 1, dtype=np.int64)
+        cy = np.arange(math.floor((extent[1] - radius) / size), math.floor((extent[3] + radius) / size) + 1, dtype=np.int64)
+        keys = self._key(np.repeat(cx, len(cy)), np.tile(cy, len(cx)))
+        n = np.searchsorted(self.cell_keys, keys)
+        hit = n < len(self.cell_keys)
+        hit[hit] = self.cell_keys[n[hit]] == keys[hit]
+        n = n[hit]
+        if not len(n):
+            return np.zeros(0, dtype=np.int64)
+        if len(n) == 1:
+            return self.cell_segments[self.cell_start[n[0]]:self.cell_start[n[0] + 1]]
+        return np.unique(np.concatenate([self.cell_segments[self.cell_start[i]:self.cell_start[i + 1]] for i in n]))
+
+    def nearest(self, x, y, max_dist):
+        """Snaps the point (x, y) to the nearest flowline within max_dist. Returns
+        (edge, measure, distance) or None if no flowline is that close. Ties go to
+        the lowest numbered segment so results do not depend on the grid."""
+        seg = self.segments((x, y, x, y), max_dist)
+        if not len(seg):
+            return None
+        x0 = self.x0[seg]
+        y0 = self.y0[seg]
+        dx = self.x1[seg] - x0
+        dy = self.y1[seg] - y0
+        length2 = dx * dx + dy * dy
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = np.clip(((x - x0) * dx + (y - y0) * dy) / length2, 0.0, 1.0)
+        t[length2 == 0.0] = 0.0
+        dist = np.hypot(x - (x0 + t * dx), y - (y0 + t * dy))
+        i = int(np.argmin(dist))
+        if dist[i] > max_dist:
+            return None
+        s = seg[i]
+        return int(self.edge[s]), float(self.measure[s] + t[i] * self.length[s]), float(dist[i])
+
+    def snap(self, points, max_dist):
+        """Snaps a list of (key, x, y) points. Returns a list of (key, edge, measure,
+        distance) for the points within max_dist of a flowline, and the list of keys
+        of the points that were not, so they can be reported together."""
+        snapped = []
+        missed = []
+        for key, x, y in points:
+            found = self.nearest(x, y, max_dist)
+            if found is None:
+                missed.append(key)
+            else:
+                snapped.append((key,) + found)
+        return snapped, missed
+
+    def snap_shape(self, key, shape, max_dist):
+        """Snaps every vertex of shape to its nearest flowline within max_dist. The
+        flowline segments near the shape are found once and all of its vertices
+        are measured against them together, which is much faster than calling
+        nearest() per vertex for long lines and polygons. Returns a list of (key,
+        edge, measure, distance) in vertex order, leaving out vertices that are not
+        within max_dist of a flowline."""
+        seg = self.segments(shape.extent, max_dist)
+        if not len(seg):
+            return []
+        xy = np.array([p for part in shape.parts for p in part], dtype=np.float64)
+        x0 = self.x0[seg]
+        y0 = self.y0[seg]
+        dx = self.x1[seg] - x0
+        dy = self.y1[seg] - y0
+        length2 = dx * dx + dy * dy
+        length2[length2 == 0.0] = np.inf
+        snapped = []
+        # keep the vertex by segment arrays to about a million values
+        step = max(1, 1000000 // len(seg))
+        for i in range(0, len(xy), step):
+            px = xy[i:i + step, 0:1]
+            py = xy[i:i + step, 1:2]
+            t = np.clip(((px - x0) * dx + (py - y0) * dy) / length2, 0.0, 1.0)
+            dist = np.hypot(px - (x0 + t * dx), py - (y0 + t * dy))
+            best = np.argmin(dist, axis=1)
+            rows = np.arange(len(best))
+            for n in np.flatnonzero(dist[rows, best] <= max_dist):
+                s = seg[best[n]]
+                snapped.append((key, int(self.edge[s]), float(self.measure[s] + t[n, best[n]] * self.length[s]), float(dist[n, best[n]])))
+        return snapped
+
+    def stretches(self, shape, radius):
+        """Returns a list of (edge, low, high) giving, for each flowline within
+        radius of shape, the measures of the first and last of its segments that
+        are within radius. Used to find where an EO rep touches the network."""
+        found = {}
+        for s in self.segments(shape.extent, radius):
+            segment = geometry.Shape("line", [[(self.x0[s], self.y0[s]), (self.x1[s], self.y1[s])]])
+            if geometry.within(segment, shape, radius):
+                edge = int(self.edge[s])
+                low = float(self.measure[s])
+                high = low + float(self.length[s])
+                if edge in found:
+                    low = min(low, found[edge][0])
+                    high = max(high, found[edge][1])
+                found[edge] = (low, high)
+        return [(edge, low, high) for edge, (low, high) in sorted(found.items())]